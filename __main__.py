@@ -3,7 +3,7 @@ import socket
 import sys
 from time import sleep
 import webbrowser
-from threading import Thread
+from threading import Thread, Timer
 
 from model import wallet
 from model.blockchain import Blockchain
@@ -21,11 +21,15 @@ def get_ip_address():
 
 
 if __name__ == '__main__':
+    # --asgi: servidor HTTP ASGI e servidor P2P no mesmo event loop.
+    args = [arg for arg in sys.argv[1:] if arg != '--asgi']
+    asgi_mode = len(args) != len(sys.argv) - 1
+
     http_port = None
     p2p_port = None
     try:
-        http_port = int(sys.argv[1])
-        p2p_port = int(sys.argv[2])
+        http_port = int(args[0])
+        p2p_port = int(args[1])
     except:
         if http_port is None:
             http_port = 5000
@@ -34,13 +38,22 @@ if __name__ == '__main__':
     
     ip = get_ip_address()
     blockchain = Blockchain()
-    p2p_thread = Thread(target=p2p_server.init, args=[ip, p2p_port, blockchain])
-    p2p_thread.daemon = True
-    p2p_thread.start()
 
-    http_thread = Thread(target=server.run, args=[ip, http_port, p2p_port, blockchain])
-    http_thread.start()
+    if asgi_mode:
+        from server import asgi
+
+        browser = Timer(2, webbrowser.open, args=[f'http://{ip}:{http_port}'])
+        browser.daemon = True
+        browser.start()
+        asgi.run(ip, http_port, p2p_port, blockchain)
+    else:
+        p2p_thread = Thread(target=p2p_server.init, args=[ip, p2p_port, blockchain])
+        p2p_thread.daemon = True
+        p2p_thread.start()
+
+        http_thread = Thread(target=server.run, args=[ip, http_port, p2p_port, blockchain])
+        http_thread.start()
 
-    sleep(2)
+        sleep(2)
 
-    webbrowser.open(f'http://{ip}:{http_port}')
+        webbrowser.open(f'http://{ip}:{http_port}')
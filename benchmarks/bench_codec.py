@@ -0,0 +1,85 @@
+"""
+Compare the size and the encode/decode throughput of P2P messages in JSON and
+in the binary format.
+
+Usage:
+
+    $ python -m benchmarks.bench_codec [transactions per block...]
+"""
+import json
+import sys
+import time
+from hashlib import sha256, sha512
+
+from model import Block
+from model.transaction import Transaction, get_coinbase_transaction
+from network import codec
+from network.p2p_server import Message, MessageType
+
+DEFAULT_SIZES = [0, 10, 100, 1000]
+MEASURE_TIME = 0.5  # in seconds, per measurement
+
+
+def make_block(transactions: int) -> Block:
+    addresses = [sha512(str(i).encode()).hexdigest() for i in range(10)]
+    block_transactions = [get_coinbase_transaction(addresses[0])]
+    for i in range(transactions):
+        block_transactions.append(Transaction(
+            addresses[i % 10], addresses[(i + 1) % 10], i + 1))
+
+    return Block(1, block_transactions, 12345, 4,
+                 sha256(b'previous').hexdigest(), cumulative_work=32)
+
+
+def measure(function) -> float:
+    """
+    :return: <float> Calls per second of `function`.
+    """
+
+    calls = 0
+    started_at = time.perf_counter()
+    while True:
+        function()
+        calls += 1
+        elapsed = time.perf_counter() - started_at
+        if elapsed >= MEASURE_TIME:
+            return calls / elapsed
+
+
+def bench(encoding: str, message) -> dict:
+    encoded = codec.encode(message, encoding)
+    if encoding == codec.JSON:
+        decode = lambda: json.loads(encoded)
+    else:
+        decode = lambda: codec.decode(encoded)
+
+    return {
+        'size': len(encoded),
+        'encode': measure(lambda: codec.encode(message, encoding)),
+        'decode': measure(decode)
+    }
+
+
+def main(sizes):
+    print(f'{"transactions":>12} {"format":>8} {"bytes":>9} {"ratio":>6} '
+          f'{"encode/s":>9} {"decode/s":>9} {"encode MB/s":>11} '
+          f'{"decode MB/s":>11}')
+
+    for size in sizes:
+        message = Message(MessageType.RESPONSE_LATEST_BLOCK, make_block(size))
+        results = {encoding: bench(encoding, message)
+                   for encoding in (codec.JSON, codec.BINARY)}
+
+        for encoding, result in results.items():
+            ratio = result['size'] / results[codec.JSON]['size']
+            megabytes = result['size'] / 1024 / 1024
+            print(f'{size:>12} {encoding:>8} {result["size"]:>9} '
+                  f'{ratio:>6.2f} {result["encode"]:>9.0f} '
+                  f'{result["decode"]:>9.0f} '
+                  f'{result["encode"] * megabytes:>11.1f} '
+                  f'{result["decode"] * megabytes:>11.1f}')
+
+
+if __name__ == '__main__':
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    main(sizes)
@@ -0,0 +1,115 @@
+"""
+Throughput of a Blockchain under mixed read and write load: one writer
+appends blocks and pool transactions while reader threads run wallet, chain
+and transaction queries. Readers either use the published snapshot, without
+locks, or hold the writer lock while reading, as a single coarse lock would.
+
+Usage:
+
+    $ python -m benchmarks.bench_concurrency [readers...]
+"""
+import sys
+import tempfile
+import time
+from threading import Thread
+
+from model import pagination, wallet
+import model.blockchain as blockchain_module
+from model.blockchain import Blockchain
+from model.proof_of_work import find_proof
+from model.transaction import create_transaction
+from network import p2p_server
+
+DEFAULT_READERS = [1, 4, 8]
+MEASURE_TIME = 2  # in seconds, per mode
+READ_INTERVAL = 0.001  # in seconds, between the queries of a reader
+RECEIVER = 'f' * 128
+
+
+def read_snapshot(blockchain, address: str):
+    snapshot = blockchain.snapshot
+    snapshot.get_balance(address)
+    pagination.get_blocks_page(snapshot.chain)
+    pagination.get_pending_page(snapshot.transaction_pool)
+
+
+def read_locked(blockchain, address: str):
+    with blockchain._lock:
+        blockchain.ledger.get_balance(address)
+        pagination.get_blocks_page(blockchain.chain)
+        pagination.get_pending_page(blockchain.transaction_pool)
+
+
+def write(blockchain, address: str):
+    proof = find_proof(blockchain.last_block.proof, 1)
+    blockchain.append_block(blockchain.create_block(proof))
+    blockchain.append_transaction(create_transaction(address, RECEIVER, 1))
+
+
+def measure(read, readers: int, path: str) -> dict:
+    blockchain_module.BLOCKCHAIN_PATH = f'{path}/'
+    blockchain = Blockchain()
+    p2p_server.blockchain = blockchain
+    address = wallet.get_identifier()
+
+    stop = False
+    writes = []
+    reads = []
+
+    def writer():
+        while not stop:
+            started_at = time.perf_counter()
+            write(blockchain, address)
+            writes.append(time.perf_counter() - started_at)
+
+    def reader():
+        latencies = []
+        while not stop:
+            started_at = time.perf_counter()
+            read(blockchain, address)
+            latencies.append(time.perf_counter() - started_at)
+            time.sleep(READ_INTERVAL)
+        reads.extend(latencies)
+
+    threads = [Thread(target=writer)] + \
+        [Thread(target=reader) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(MEASURE_TIME)
+    stop = True
+    for thread in threads:
+        thread.join()
+    blockchain.close()
+
+    reads.sort()
+    writes.sort()
+    return {
+        'reads': len(reads) / MEASURE_TIME,
+        'read_p99': get_percentile(reads, 0.99) * 1000,
+        'writes': len(writes) / MEASURE_TIME,
+        'write_p99': get_percentile(writes, 0.99) * 1000
+    }
+
+
+def get_percentile(values, percentile: float) -> float:
+    return values[int(len(values) * percentile)] if values else 0.0
+
+
+def main(reader_counts):
+    wallet.init_wallet('bench', 'bench')
+    print(f'{"readers":>7} {"mode":>9} {"reads/s":>9} {"read p99 ms":>12} '
+          f'{"writes/s":>9} {"write p99 ms":>13}')
+
+    for readers in reader_counts:
+        for name, read in (('locked', read_locked),
+                           ('snapshot', read_snapshot)):
+            # Cada medição usa um diretório novo, com uma cadeia nova.
+            with tempfile.TemporaryDirectory() as path:
+                result = measure(read, readers, path)
+            print(f'{readers:>7} {name:>9} {result["reads"]:>9.0f} '
+                  f'{result["read_p99"]:>12.2f} {result["writes"]:>9.1f} '
+                  f'{result["write_p99"]:>13.2f}')
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_READERS)
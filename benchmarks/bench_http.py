@@ -0,0 +1,134 @@
+"""
+Load test of the HTTP server: requests per second and p99 latency of
+`/wallet` and `/chain/length`, with the threaded Flask server and in ASGI
+mode. Each mode runs a node in a subprocess, from a temporary directory.
+
+Usage:
+
+    $ python -m benchmarks.bench_http [requests] [concurrency]
+"""
+import http.client
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from threading import Thread
+from urllib.parse import urlencode
+
+DEFAULT_REQUESTS = 2000
+DEFAULT_CONCURRENCY = 16
+PATHS = ['/wallet', '/chain/length']
+MODES = [('threaded', []), ('asgi', ['--asgi'])]
+HTTP_PORT = 5100
+P2P_PORT = 6100
+START_TIMEOUT = 20  # in seconds
+
+PROJECT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def start_node(flags, cwd: str):
+    """
+    :return: <tuple> The node process and the IP address it listens on.
+    """
+
+    environment = dict(os.environ, BROWSER='true', PYTHONUNBUFFERED='1')
+    process = subprocess.Popen(
+        [sys.executable, PROJECT_PATH, str(HTTP_PORT), str(P2P_PORT), *flags],
+        cwd=cwd, env=environment, stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL, text=True)
+
+    # O endereço é o mesmo do servidor P2P, impresso ao iniciar.
+    for line in process.stdout:
+        if 'P2P server running on' in line:
+            ip = line.split('ws://')[1].split(':')[0]
+            break
+    else:
+        raise RuntimeError('Node did not start.')
+
+    started_at = time.monotonic()
+    while time.monotonic() - started_at < START_TIMEOUT:
+        try:
+            connection = http.client.HTTPConnection(ip, HTTP_PORT, timeout=1)
+            connection.request('GET', '/login')
+            connection.getresponse().read()
+            return process, ip
+        except OSError:
+            time.sleep(0.1)
+
+    process.kill()
+    raise RuntimeError('HTTP server did not start.')
+
+
+def login(ip: str):
+    connection = http.client.HTTPConnection(ip, HTTP_PORT)
+    body = urlencode({'username': 'bench', 'password': 'bench'})
+    connection.request('POST', '/login', body, {
+        'Content-Type': 'application/x-www-form-urlencoded'})
+    connection.getresponse().read()
+
+
+def load(ip: str, path: str, requests: int, concurrency: int) -> dict:
+    latencies = []
+    errors = []
+
+    def worker(count: int):
+        connection = http.client.HTTPConnection(ip, HTTP_PORT)
+        for _ in range(count):
+            started_at = time.perf_counter()
+            try:
+                connection.request('GET', path)
+                response = connection.getresponse()
+                response.read()
+                if response.status != 200:
+                    errors.append(response.status)
+            except (OSError, http.client.HTTPException) as error:
+                errors.append(error)
+                connection.close()
+                connection = http.client.HTTPConnection(ip, HTTP_PORT)
+            latencies.append(time.perf_counter() - started_at)
+
+    workers = [Thread(target=worker, args=[requests // concurrency])
+               for _ in range(concurrency)]
+    started_at = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started_at
+
+    latencies.sort()
+    return {
+        'rps': len(latencies) / elapsed,
+        'p50': latencies[len(latencies) // 2] * 1000,
+        'p99': latencies[int(len(latencies) * 0.99)] * 1000,
+        'errors': len(errors)
+    }
+
+
+def main(requests: int, concurrency: int):
+    print(f'{requests} requests, {concurrency} concurrent')
+    print(f'{"mode":>9} {"path":>14} {"req/s":>8} {"p50 ms":>8} '
+          f'{"p99 ms":>8} {"errors":>7}')
+
+    for mode, flags in MODES:
+        with tempfile.TemporaryDirectory() as cwd:
+            process, ip = start_node(flags, cwd)
+            try:
+                login(ip)
+                for path in PATHS:
+                    load(ip, path, concurrency, concurrency)  # aquecimento
+                    result = load(ip, path, requests, concurrency)
+                    print(f'{mode:>9} {path:>14} {result["rps"]:>8.0f} '
+                          f'{result["p50"]:>8.1f} {result["p99"]:>8.1f} '
+                          f'{result["errors"]:>7}')
+            finally:
+                process.kill()
+                process.wait()
+
+
+if __name__ == '__main__':
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_REQUESTS
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 \
+        else DEFAULT_CONCURRENCY
+    main(requests, concurrency)
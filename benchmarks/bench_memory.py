@@ -0,0 +1,125 @@
+"""
+Measure the memory used by a synthetic chain, in bytes per transaction and
+per block, with the slotted Block and Transaction classes and with
+dict-backed classes equivalent to the previous ones.
+
+Usage:
+
+    $ python -m benchmarks.bench_memory [transactions] [transactions per block]
+"""
+import sys
+import time
+import tracemalloc
+from hashlib import sha256, sha512
+
+from model import Block
+from model.transaction import Transaction
+
+DEFAULT_TRANSACTIONS = 1000000
+DEFAULT_BLOCK_SIZE = 1000
+ADDRESSES = 1000  # distinct wallets in the synthetic chain
+
+
+class DictTransaction:
+    def __init__(self, sender, receiver, amount, timestamp=None):
+        self.sender = sender
+        self.receiver = receiver
+        self.amount = amount
+        self.timestamp = timestamp if timestamp is not None else time.time()
+        self._id = None
+
+
+class DictBlock:
+    def __init__(self, index, transactions, proof, difficult, previous_hash,
+                 hash=None, timestamp=None, cumulative_work=None,
+                 merkle_root=None):
+        self.index = index
+        self.timestamp = timestamp if timestamp is not None else time.time()
+        self.transactions = transactions
+        self.proof = proof
+        self.difficult = difficult
+        self.previous_hash = previous_hash
+        self.merkle_root = merkle_root
+        self.hash = hash
+        self.cumulative_work = cumulative_work
+
+
+def copy(text: str) -> str:
+    # Strings decoded from disk or from the network are new objects, even
+    # when equal to one already in memory.
+    return text[:1] + text[1:]
+
+
+def build_chain(block_class, transaction_class, transactions: int,
+                block_size: int):
+    addresses = [sha512(str(i).encode()).hexdigest() for i in range(ADDRESSES)]
+    previous_hash = ''
+    chain = []
+
+    for index in range((transactions + block_size - 1) // block_size):
+        count = min(block_size, transactions - index * block_size)
+        block_transactions = [
+            transaction_class(
+                copy(addresses[i % ADDRESSES]),
+                copy(addresses[(i * 7 + 1) % ADDRESSES]),
+                i,
+                1600000000.0 + i)
+            for i in range(index * block_size, index * block_size + count)
+        ]
+        hash = sha256(str(index).encode()).hexdigest()
+        chain.append(block_class(
+            index=index,
+            transactions=block_transactions,
+            proof=index,
+            difficult=5,
+            previous_hash=copy(previous_hash),
+            hash=copy(hash),
+            timestamp=1600000000.0 + index,
+            cumulative_work=32 * (index + 1),
+            merkle_root=copy(hash)))
+        previous_hash = hash
+
+    return chain
+
+
+def measure(block_class, transaction_class, transactions: int,
+            block_size: int) -> dict:
+    tracemalloc.start()
+    started_at = time.perf_counter()
+    chain = build_chain(block_class, transaction_class, transactions,
+                        block_size)
+    elapsed = time.perf_counter() - started_at
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    blocks = len(chain)
+    del chain
+    return {
+        'bytes': used,
+        'per_transaction': used / transactions,
+        'per_block': used / blocks,
+        'seconds': elapsed
+    }
+
+
+def main(transactions: int, block_size: int):
+    print(f'{transactions} transactions, {block_size} per block')
+    print(f'{"classes":>8} {"MiB":>9} {"B/transaction":>14} {"B/block":>11} '
+          f'{"build s":>8}')
+
+    for name, block_class, transaction_class in (
+            ('dict', DictBlock, DictTransaction),
+            ('slots', Block, Transaction)):
+        result = measure(block_class, transaction_class, transactions,
+                         block_size)
+        print(f'{name:>8} {result["bytes"] / 1024 / 1024:>9.1f} '
+              f'{result["per_transaction"]:>14.1f} '
+              f'{result["per_block"]:>11.0f} {result["seconds"]:>8.2f}')
+
+
+if __name__ == '__main__':
+    transactions = int(sys.argv[1]) if len(sys.argv) > 1 \
+        else DEFAULT_TRANSACTIONS
+    block_size = int(sys.argv[2]) if len(sys.argv) > 2 \
+        else DEFAULT_BLOCK_SIZE
+    main(transactions, block_size)
@@ -0,0 +1,239 @@
+"""
+Mining benchmark suite:
+
+- hash rate of the Proof of Work kernel on one core and of the parallel
+  miner, and time to find a block at each difficult. The miner hash rate
+  counts the nonces its workers tested, over the whole search time, so at
+  low difficults it also shows the cost of dispatching each search;
+- deterministic simulation of the difficult adjustment of
+  `Blockchain.get_difficult`, with the network hash power changing over
+  time, showing how far block times stray from `block_generation_inverval`.
+
+The simulation is seeded, so its numbers only change when the adjustment
+rule changes. With `--json` the results are printed as one JSON document,
+to be stored and compared between versions.
+
+Usage:
+
+    $ python -m benchmarks.bench_mining [--json] [difficults...]
+"""
+import json
+import random
+import statistics
+import sys
+import time
+
+from model import Block
+from model.blockchain import Blockchain
+from model.miner import get_miner
+from model.proof_of_work import ProofSearch
+
+DEFAULT_DIFFICULTS = [1, 2, 3, 4]
+SAMPLES = 10  # blocks searched at each difficult
+SIMULATION_BLOCKS = 600
+SIMULATION_SEED = 1
+# Hash power of the network by block index, relative to the hash power that
+# finds a block at the initial difficult every `block_generation_inverval`.
+HASH_POWER_SCHEDULE = [(0, 1), (150, 4), (300, 0.25), (450, 1)]
+RECOVERY_TOLERANCE = 0.25  # relative distance of the window mean to target
+
+
+class SimulatedBlockchain(Blockchain):
+    """
+    Blockchain whose difficult changes are not written to disk.
+    """
+
+    def save_metadata(self):
+        pass
+
+
+def get_summary(values) -> dict:
+    values = sorted(values)
+    return {
+        'mean': statistics.fmean(values),
+        'median': statistics.median(values),
+        'p90': values[int(len(values) * 0.9)],
+        'max': values[-1]
+    }
+
+
+def bench_kernel(difficult: int) -> dict:
+    times = []
+    hashes = 0
+    for last_proof in range(1, SAMPLES + 1):
+        search = ProofSearch(last_proof, difficult)
+        search.run()
+        times.append(search.elapsed)
+        hashes += search.hashes
+
+    return {
+        'hash_rate': hashes / sum(times),
+        'hashes_per_block': hashes / SAMPLES,
+        'expected_hashes_per_block': 16 ** difficult,
+        'block_seconds': get_summary(times)
+    }
+
+
+def bench_miner(difficult: int) -> dict:
+    miner = get_miner()
+    miner.start()
+
+    times = []
+    hashes = miner.hashes
+    for last_proof in range(1, SAMPLES + 1):
+        started_at = time.perf_counter()
+        miner.search(last_proof, difficult)
+        times.append(time.perf_counter() - started_at)
+
+    hashes = miner.hashes - hashes
+    return {
+        'workers': miner.workers,
+        'hash_rate': hashes / sum(times),
+        'hashes_per_block': hashes / SAMPLES,
+        'block_seconds': get_summary(times)
+    }
+
+
+def get_hash_power(index: int) -> float:
+    power = HASH_POWER_SCHEDULE[0][1]
+    for start, value in HASH_POWER_SCHEDULE:
+        if index >= start:
+            power = value
+    return power
+
+
+def simulate(blocks: int = SIMULATION_BLOCKS,
+             seed: int = SIMULATION_SEED) -> dict:
+    """
+    Mine `blocks` blocks with the difficult given by get_difficult and block
+    intervals drawn from the exponential distribution of a Proof of Work
+    search at the scheduled hash power.
+    """
+
+    rng = random.Random(seed)
+    blockchain = SimulatedBlockchain()
+    target = blockchain.block_generation_inverval
+    window = blockchain.difficult_adjustment_interval
+    base_rate = 16 ** blockchain.difficult / target
+
+    blockchain.chain = [Block(index=0, transactions=[], previous_hash='',
+                              proof=1, difficult=blockchain.difficult,
+                              timestamp=0.0)]
+
+    now = 0.0
+    intervals = []
+    difficults = []
+    for index in range(1, blocks + 1):
+        difficult = blockchain.get_difficult()
+        hash_rate = base_rate * get_hash_power(index)
+        interval = rng.expovariate(hash_rate / 16 ** difficult)
+        now += interval
+
+        # Os blocos simulados não passam pela validação da prova.
+        blockchain.chain.append(Block(
+            index=index, transactions=[], proof=0, difficult=difficult,
+            previous_hash=blockchain.last_block.hash, timestamp=now))
+        intervals.append(interval)
+        difficults.append(difficult)
+
+    phases = []
+    for position, (start, power) in enumerate(HASH_POWER_SCHEDULE):
+        end = HASH_POWER_SCHEDULE[position + 1][0] \
+            if position + 1 < len(HASH_POWER_SCHEDULE) else blocks + 1
+        start = max(start, 1)
+        phase = intervals[start - 1:end - 1]
+        if not phase:
+            continue
+
+        phases.append({
+            'start': start,
+            'hash_power': power,
+            'blocks': len(phase),
+            'block_seconds': get_summary(phase),
+            'mean_error': statistics.fmean(
+                abs(interval - target) for interval in phase),
+            'difficults': sorted(set(difficults[start - 1:end - 1])),
+            'blocks_to_recover': get_recovery(phase, target, window)
+        })
+
+    window_means = [statistics.fmean(intervals[i:i + window])
+                    for i in range(0, len(intervals) - window + 1)]
+    return {
+        'seed': seed,
+        'blocks': blocks,
+        'target_seconds': target,
+        'adjustment_interval': window,
+        'block_seconds': get_summary(intervals),
+        'mean_error': statistics.fmean(
+            abs(interval - target) for interval in intervals),
+        'max_window_deviation': max(
+            abs(mean - target) / target for mean in window_means),
+        'phases': phases
+    }
+
+
+def get_recovery(intervals, target: float, window: int) -> int:
+    """
+    :return: <int> Blocks until the mean of the last `window` intervals is
+    within RECOVERY_TOLERANCE of `target`, or None if it never is.
+    """
+
+    for end in range(window, len(intervals) + 1):
+        mean = statistics.fmean(intervals[end - window:end])
+        if abs(mean - target) <= RECOVERY_TOLERANCE * target:
+            return end
+    return None
+
+
+def print_table(results: dict):
+    print(f'{"difficult":>9} {"kernel h/s":>11} {"kernel s/block":>15} '
+          f'{"miner h/s":>11} {"miner s/block":>14}')
+    for result in results['difficults']:
+        kernel = result['kernel']
+        miner = result['miner']
+        print(f'{result["difficult"]:>9} {kernel["hash_rate"]:>11.0f} '
+              f'{kernel["block_seconds"]["mean"]:>15.4f} '
+              f'{miner["hash_rate"]:>11.0f} '
+              f'{miner["block_seconds"]["mean"]:>14.4f}')
+
+    simulation = results['simulation']
+    print()
+    print(f'Simulation: {simulation["blocks"]} blocks, target '
+          f'{simulation["target_seconds"]} s, seed {simulation["seed"]}')
+    print(f'{"start":>6} {"power":>6} {"mean s":>8} {"median s":>9} '
+          f'{"p90 s":>8} {"error s":>8} {"difficults":>12} {"recover":>8}')
+    for phase in simulation['phases']:
+        seconds = phase['block_seconds']
+        difficults = '-'.join(str(difficult) for difficult
+                              in (phase['difficults'][0],
+                                  phase['difficults'][-1]))
+        print(f'{phase["start"]:>6} {phase["hash_power"]:>6} '
+              f'{seconds["mean"]:>8.2f} {seconds["median"]:>9.2f} '
+              f'{seconds["p90"]:>8.2f} {phase["mean_error"]:>8.2f} '
+              f'{difficults:>12} {str(phase["blocks_to_recover"]):>8}')
+    print(f'Max deviation of a window mean from the target: '
+          f'{simulation["max_window_deviation"]:.0%}')
+
+
+def main(difficults, as_json: bool):
+    results = {'difficults': [], 'simulation': simulate()}
+    try:
+        for difficult in difficults:
+            results['difficults'].append({
+                'difficult': difficult,
+                'kernel': bench_kernel(difficult),
+                'miner': bench_miner(difficult)
+            })
+    finally:
+        get_miner().shutdown()
+
+    if as_json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_table(results)
+
+
+if __name__ == '__main__':
+    args = [arg for arg in sys.argv[1:] if arg != '--json']
+    difficults = [int(arg) for arg in args] or DEFAULT_DIFFICULTS
+    main(difficults, as_json=len(args) != len(sys.argv) - 1)
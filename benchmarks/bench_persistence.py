@@ -0,0 +1,80 @@
+"""
+Cost of persistence on the hot path: latency of appending blocks and pool
+transactions when every change is written before returning, as the
+synchronous saves did, and with the write-behind worker.
+
+Usage:
+
+    $ python -m benchmarks.bench_persistence [blocks]
+"""
+import sys
+import tempfile
+import time
+
+from model import wallet
+import model.blockchain as blockchain_module
+from model.blockchain import Blockchain
+from model.proof_of_work import find_proof
+from model.transaction import create_transaction
+from network import p2p_server
+
+DEFAULT_BLOCKS = 300
+TRANSACTIONS_PER_BLOCK = 5
+RECEIVER = 'f' * 128
+
+
+def measure(blocks: int, synchronous: bool) -> dict:
+    with tempfile.TemporaryDirectory() as path:
+        blockchain_module.BLOCKCHAIN_PATH = f'{path}/'
+        blockchain = Blockchain()
+        p2p_server.blockchain = blockchain
+        address = wallet.get_identifier()
+
+        latencies = []
+        started_at = time.perf_counter()
+        for _ in range(blocks):
+            changes = [lambda: blockchain.append_transaction(
+                create_transaction(address, RECEIVER, 1))
+                for _ in range(TRANSACTIONS_PER_BLOCK)]
+            proof = find_proof(blockchain.last_block.proof, 1)
+            block = blockchain.create_block(proof)
+            changes.append(lambda: blockchain.append_block(block))
+
+            for change in changes:
+                change_started_at = time.perf_counter()
+                change()
+                if synchronous:
+                    blockchain.flush()
+                latencies.append(time.perf_counter() - change_started_at)
+
+        blockchain.flush()
+        elapsed = time.perf_counter() - started_at
+        stats = blockchain.get_persistence_stats()
+        blockchain.close()
+
+    latencies.sort()
+    return {
+        'changes': len(latencies) / elapsed,
+        'p50': latencies[len(latencies) // 2] * 1000,
+        'p99': latencies[int(len(latencies) * 0.99)] * 1000,
+        'saves': stats['saves'],
+        'notifications': stats['notifications']
+    }
+
+
+def main(blocks: int):
+    wallet.init_wallet('bench', 'bench')
+    print(f'{blocks} blocks, {TRANSACTIONS_PER_BLOCK} transactions each')
+    print(f'{"mode":>13} {"changes/s":>10} {"p50 ms":>8} {"p99 ms":>8} '
+          f'{"saves":>6} {"changes":>8}')
+
+    for name, synchronous in (('synchronous', True),
+                              ('write-behind', False)):
+        result = measure(blocks, synchronous)
+        print(f'{name:>13} {result["changes"]:>10.0f} {result["p50"]:>8.3f} '
+              f'{result["p99"]:>8.3f} {result["saves"]:>6} '
+              f'{result["notifications"]:>8}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_BLOCKS)
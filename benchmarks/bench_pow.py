@@ -0,0 +1,69 @@
+"""
+Compare the batched Proof of Work kernel with a nonce loop built on
+`Blockchain.validate_proof`.
+
+Usage:
+
+    $ python -m benchmarks.bench_pow [difficults...]
+"""
+import sys
+import time
+
+from model.blockchain import Blockchain
+from model.proof_of_work import ProofSearch
+
+DEFAULT_DIFFICULTS = [1, 2, 3, 4]
+TEMPLATES = 5  # block templates searched at each difficult
+
+
+def legacy_search(blockchain: Blockchain, last_proof: int) -> int:
+    proof = last_proof + 1
+    while blockchain.validate_proof(proof, last_proof) is False:
+        proof += 1
+    return proof
+
+
+def bench_legacy(difficult: int) -> dict:
+    blockchain = Blockchain()
+    blockchain.difficult = difficult
+
+    hashes = 0
+    started_at = time.perf_counter()
+    for last_proof in range(1, TEMPLATES + 1):
+        proof = legacy_search(blockchain, last_proof)
+        hashes += proof - last_proof
+    elapsed = time.perf_counter() - started_at
+
+    return {'hashes': hashes, 'seconds': elapsed}
+
+
+def bench_kernel(difficult: int) -> dict:
+    hashes = 0
+    elapsed = 0.0
+    for last_proof in range(1, TEMPLATES + 1):
+        search = ProofSearch(last_proof, difficult)
+        search.run()
+        hashes += search.hashes
+        elapsed += search.elapsed
+
+    return {'hashes': hashes, 'seconds': elapsed}
+
+
+def main(difficults):
+    print(f'{"difficult":>9} {"validate_proof h/s":>19} {"kernel h/s":>12} '
+          f'{"speedup":>8}')
+
+    for difficult in difficults:
+        legacy = bench_legacy(difficult)
+        kernel = bench_kernel(difficult)
+
+        legacy_rate = legacy['hashes'] / legacy['seconds']
+        kernel_rate = kernel['hashes'] / kernel['seconds']
+
+        print(f'{difficult:>9} {legacy_rate:>19.0f} {kernel_rate:>12.0f} '
+              f'{kernel_rate / legacy_rate:>7.2f}x')
+
+
+if __name__ == '__main__':
+    difficults = [int(arg) for arg in sys.argv[1:]] or DEFAULT_DIFFICULTS
+    main(difficults)
@@ -0,0 +1,82 @@
+"""
+Time for a restarted node to know its balances: replaying every stored
+block against loading the newest ledger checkpoint and applying only the
+blocks after it. Uses a synthetic chain written to a temporary store.
+
+Usage:
+
+    $ python -m benchmarks.bench_restart [blocks] [transactions per block]
+"""
+import sys
+import tempfile
+import time
+from hashlib import sha512
+
+from model import Block
+from model.chain import Chain
+from model.ledger import Ledger
+from model.storage import BlockStore
+from model.transaction import Transaction
+
+DEFAULT_BLOCKS = 2000
+DEFAULT_BLOCK_SIZE = 50
+ADDRESSES = 1000  # distinct wallets in the synthetic chain
+CHECKPOINT_DISTANCE = 50  # blocks between the checkpoint and the tip
+
+
+def build_store(path: str, blocks: int, block_size: int) -> BlockStore:
+    addresses = [sha512(str(i).encode()).hexdigest() for i in range(ADDRESSES)]
+    store = BlockStore(path)
+    previous_hash = ''
+    chain = []
+
+    for index in range(blocks):
+        transactions = [
+            Transaction(addresses[i % ADDRESSES],
+                        addresses[(i * 7 + 1) % ADDRESSES],
+                        1,
+                        1600000000.0 + i)
+            for i in range(index * block_size, (index + 1) * block_size)
+        ]
+        block = Block(index=index, transactions=transactions, proof=index,
+                      difficult=1, previous_hash=previous_hash,
+                      timestamp=1600000000.0 + index)
+        previous_hash = block.hash
+        chain.append(block)
+
+    store.write_blocks(chain)
+
+    height = blocks - CHECKPOINT_DISTANCE
+    ledger = Ledger.from_chain(chain[:height], [])
+    store.save_checkpoint(ledger.to_checkpoint(height, chain[height - 1].hash))
+    return store
+
+
+def measure(store: BlockStore, use_checkpoints: bool) -> float:
+    started_at = time.perf_counter()
+    chain = Chain(store)
+    checkpoints = store.load_checkpoints() if use_checkpoints else []
+    Ledger.from_chain(chain, [], checkpoints)
+    return time.perf_counter() - started_at
+
+
+def main(blocks: int, block_size: int):
+    print(f'{blocks} blocks, {block_size} transactions per block, '
+          f'checkpoint {CHECKPOINT_DISTANCE} blocks below the tip')
+
+    with tempfile.TemporaryDirectory() as path:
+        store = build_store(path, blocks, block_size)
+
+        replay = measure(store, False)
+        checkpoint = measure(store, True)
+
+    print(f'{"full replay":>12} {replay:>8.3f} s')
+    print(f'{"checkpoint":>12} {checkpoint:>8.3f} s '
+          f'({replay / checkpoint:.1f}x faster)')
+
+
+if __name__ == '__main__':
+    blocks = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_BLOCKS
+    block_size = int(sys.argv[2]) if len(sys.argv) > 2 \
+        else DEFAULT_BLOCK_SIZE
+    main(blocks, block_size)
@@ -0,0 +1,209 @@
+from threading import Lock
+
+try:
+    import numpy as np
+except ImportError:  # NumPy é opcional; sem ele a análise fica indisponível.
+    np = None
+
+from model.transaction import COINBASE_SENDER
+
+MAX_SERIES = 10000  # blocks per supply or block stats response
+
+
+def is_available() -> bool:
+    return np is not None
+
+
+class Analytics:
+    """
+    Columnar copy of the confirmed transactions: sender and receiver as
+    address codes, amount, timestamp and block index, one NumPy array each.
+    Balances and per-block figures are computed with vectorized group-bys
+    instead of scanning the transactions once per address. The columns are
+    extended as blocks are appended and rebuilt when the chain forks below
+    them; a chain that is only an older prefix of the columns is ignored.
+    """
+
+    def __init__(self):
+        if np is None:
+            raise RuntimeError("Análise indisponível: instale o NumPy.")
+
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self):
+        self.addresses = []
+        self.codes = {}  # address code by address
+        self.senders = np.zeros(0, dtype=np.int64)
+        self.receivers = np.zeros(0, dtype=np.int64)
+        self.amounts = np.zeros(0, dtype=np.float64)
+        self.timestamps = np.zeros(0, dtype=np.float64)
+        self.blocks = np.zeros(0, dtype=np.int64)
+        self.block_timestamps = np.zeros(0, dtype=np.float64)
+        self.height = 0
+        self.block_hashes = []
+
+    def get_code(self, address: str) -> int:
+        code = self.codes.get(address)
+        if code is None:
+            code = len(self.addresses)
+            self.codes[address] = code
+            self.addresses.append(address)
+        return code
+
+    def update(self, chain):
+        """
+        Add the blocks appended to `chain` since the last update, or rebuild
+        the columns if the blocks they were built from are no longer in it.
+        A chain shorter than the columns whose blocks they already have, as
+        in a snapshot older than the last update, is ignored.
+        """
+
+        with self._lock:
+            length = len(chain)
+            if 0 < length < self.height and \
+                    chain[length - 1].hash == self.block_hashes[length - 1]:
+                return
+
+            if self.height > length or (
+                    self.height > 0 and
+                    chain[self.height - 1].hash != self.block_hashes[-1]):
+                self.reset()
+
+            if self.height == len(chain):
+                return
+
+            senders, receivers, amounts, timestamps, blocks = [], [], [], [], []
+            block_timestamps = []
+            for index in range(self.height, len(chain)):
+                block = chain[index]
+                block_timestamps.append(block.timestamp)
+                self.block_hashes.append(block.hash)
+                for transaction in block.transactions:
+                    senders.append(self.get_code(transaction.sender))
+                    receivers.append(self.get_code(transaction.receiver))
+                    amounts.append(transaction.amount)
+                    timestamps.append(transaction.timestamp)
+                    blocks.append(index)
+
+            self.senders = np.concatenate(
+                (self.senders, np.array(senders, dtype=np.int64)))
+            self.receivers = np.concatenate(
+                (self.receivers, np.array(receivers, dtype=np.int64)))
+            self.amounts = np.concatenate(
+                (self.amounts, np.array(amounts, dtype=np.float64)))
+            self.timestamps = np.concatenate(
+                (self.timestamps, np.array(timestamps, dtype=np.float64)))
+            self.blocks = np.concatenate(
+                (self.blocks, np.array(blocks, dtype=np.int64)))
+            self.block_timestamps = np.concatenate(
+                (self.block_timestamps,
+                 np.array(block_timestamps, dtype=np.float64)))
+            self.height = len(chain)
+
+    def get_balances(self):
+        """
+        :return: <ndarray> Confirmed balance of every address, by address
+        code. Same rule as wallet.get_balance: a transaction to oneself
+        counts only as a send.
+        """
+
+        with self._lock:
+            return self._get_balances()
+
+    def _get_balances(self):
+        # Chamado com o lock: os códigos precisam corresponder às colunas.
+        count = len(self.addresses)
+        received = self.senders != self.receivers
+        return np.bincount(self.receivers[received],
+                           weights=self.amounts[received],
+                           minlength=count) - \
+            np.bincount(self.senders, weights=self.amounts, minlength=count)
+
+    def get_balance_map(self, addresses=None) -> dict:
+        with self._lock:
+            balances = self._get_balances()
+            if addresses is None:
+                addresses = [address for address in self.addresses
+                             if address != COINBASE_SENDER]
+
+            return {address: get_number(balances[self.codes[address]])
+                    if address in self.codes else 0
+                    for address in addresses}
+
+    def get_top_holders(self, limit: int = 10) -> list:
+        with self._lock:
+            balances = self._get_balances()
+            addresses = self.addresses[:len(balances)]
+            coinbase = self.codes.get(COINBASE_SENDER)
+
+        if coinbase is not None:
+            balances[coinbase] = -np.inf
+
+        limit = min(limit, len(balances))
+        if limit <= 0:
+            return []
+
+        top = np.argpartition(-balances, limit - 1)[:limit]
+        top = top[np.argsort(-balances[top], kind='stable')]
+        return [{'address': addresses[code],
+                 'balance': get_number(balances[code])}
+                for code in top if balances[code] > 0]
+
+    def get_block_stats(self, start: int = 0, limit: int = MAX_SERIES) -> list:
+        """
+        :return: <list> Number of transactions, volume and coins issued of
+        each block, with the total supply after it.
+        """
+
+        with self._lock:
+            height = self.height
+            counts = np.bincount(self.blocks, minlength=height)
+            volume = np.bincount(self.blocks, weights=self.amounts,
+                                 minlength=height)
+
+            coinbase = self.codes.get(COINBASE_SENDER)
+            issued = np.zeros(height)
+            if coinbase is not None:
+                minted = self.senders == coinbase
+                issued = np.bincount(self.blocks[minted],
+                                     weights=self.amounts[minted],
+                                     minlength=height)
+            supply = np.cumsum(issued)
+            timestamps = self.block_timestamps
+
+        stop = min(start + min(limit, MAX_SERIES), height)
+        return [{
+            'index': index,
+            'timestamp': float(timestamps[index]),
+            'transactions': int(counts[index]),
+            'volume': get_number(volume[index]),
+            'issued': get_number(issued[index]),
+            'supply': get_number(supply[index])
+        } for index in range(max(start, 0), stop)]
+
+
+def get_number(value):
+    # Valores inteiros voltam como int, como os valores das transações.
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+
+_analytics = None
+_analytics_lock = Lock()
+
+
+def get_analytics(chain=None) -> Analytics:
+    """
+    :return: <Analytics> The engine of this process, updated with `chain`.
+    """
+
+    global _analytics
+
+    with _analytics_lock:
+        if _analytics is None:
+            _analytics = Analytics()
+
+    if chain is not None:
+        _analytics.update(chain)
+    return _analytics
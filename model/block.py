@@ -2,10 +2,14 @@ import time
 from hashlib import sha256
 from typing import List
 
+from model.merkle import get_merkle_root
 from model.transaction import Transaction
 
 
 class Block:
+    __slots__ = ('index', 'timestamp', 'transactions', 'proof', 'difficult',
+                 'previous_hash', 'merkle_root', 'hash', 'cumulative_work')
+
     def __init__(
             self,
             index: int,
@@ -14,14 +18,24 @@ class Block:
             difficult: int,
             previous_hash: str,
             hash: str = None,
-            timestamp: float = None):
+            timestamp: float = None,
+            cumulative_work: int = None,
+            merkle_root: str = None):
         self.index = index
         self.timestamp = timestamp if timestamp is not None else time.time()
         self.transactions = transactions
         self.proof = proof
         self.difficult = difficult
         self.previous_hash = previous_hash
+        # Blocos antigos, recebidos com hash e sem raiz de Merkle, continuam
+        # sem ela.
+        if merkle_root is None and hash is None:
+            merkle_root = get_merkle_root(transactions)
+        self.merkle_root = merkle_root
         self.hash = hash if hash is not None else self.hash_block(self)
+        # Soma de 2 ** difficult de todos os blocos até este, inclusive. Não
+        # faz parte do hash: é recalculada por quem recebe o bloco.
+        self.cumulative_work = cumulative_work
 
     @staticmethod
     def hash_block(block: 'Block') -> str:
@@ -32,10 +46,22 @@ class Block:
         """
 
         encoded_block = f'{block.index}{block.timestamp}{block.proof}'\
-            f'{block.difficult}{block.previous_hash}'.encode()
+            f'{block.difficult}{block.previous_hash}'
+
+        # A raiz de Merkle só entra no hash dos blocos que a têm, para que o
+        # hash dos blocos antigos não mude.
+        merkle_root = getattr(block, 'merkle_root', None)
+        if merkle_root is not None:
+            encoded_block += merkle_root
+
+        encoded_block = encoded_block.encode()
 
         return sha256(encoded_block).hexdigest()
 
+    @staticmethod
+    def get_work(block: 'Block') -> int:
+        return 2 ** block.difficult
+
     @staticmethod
     def is_valid_block(block: 'Block', previous_block: 'Block') -> bool:
         """
@@ -58,13 +84,83 @@ class Block:
         if Block.hash_block(block) != block.hash:
             return False
 
+        # Depois do primeiro bloco com raiz de Merkle, todos devem tê-la.
+        merkle_root = getattr(block, 'merkle_root', None)
+        if merkle_root is None:
+            return getattr(previous_block, 'merkle_root', None) is None
+
+        if get_merkle_root(block.transactions) != merkle_root:
+            return False
+
         return True
 
+    @staticmethod
+    def get_header(block: 'Block') -> dict:
+        """
+        :return: <dict> The fields of the block without its transactions,
+        enough to check its hash.
+        """
+
+        return {
+            'index': block.index,
+            'timestamp': block.timestamp,
+            'proof': block.proof,
+            'difficult': block.difficult,
+            'previous_hash': block.previous_hash,
+            'merkle_root': getattr(block, 'merkle_root', None),
+            'hash': block.hash,
+            'cumulative_work': block.cumulative_work
+        }
+
+    @staticmethod
+    def from_header(header: dict) -> 'Block':
+        return Block(
+            index=header['index'],
+            timestamp=header['timestamp'],
+            proof=header['proof'],
+            difficult=header['difficult'],
+            hash=header['hash'],
+            previous_hash=header['previous_hash'],
+            transactions=[],
+            cumulative_work=header.get('cumulative_work'),
+            merkle_root=header.get('merkle_root')
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            'index': self.index,
+            'timestamp': self.timestamp,
+            'transactions': self.transactions,
+            'proof': self.proof,
+            'difficult': self.difficult,
+            'previous_hash': self.previous_hash,
+            'merkle_root': self.merkle_root,
+            'hash': self.hash,
+            'cumulative_work': self.cumulative_work
+        }
+
+    def __getstate__(self) -> dict:
+        return self.to_dict()
+
+    def __setstate__(self, state):
+        """
+        Restore a pickled block, including the ones pickled before the class
+        had slots, whose state is their attribute dict and may lack the
+        fields added since.
+        """
+
+        if isinstance(state, tuple):
+            state = {**(state[0] or {}), **(state[1] or {})}
+
+        for name in Block.__slots__:
+            setattr(self, name, state.get(name))
+
     def __str__(self) -> str:
         return f'{{ index: {self.index}, timestamp: {self.timestamp}, ' \
             f'transactions: {self.transactions}, ' \
             f'proof: {self.proof}, difficult: {self.difficult}, ' \
             f'previous_hash: {self.previous_hash}, '\
+            f'merkle_root: {self.merkle_root}, '\
             f'hash: {self.hash} }}'
 
     def __repr__(self) -> str:
@@ -80,7 +176,9 @@ class Block:
             hash=bdict['hash'],
             previous_hash=bdict['previous_hash'],
             transactions=[Transaction.from_dict(
-                tr) for tr in bdict['transactions']]
+                tr) for tr in bdict['transactions']],
+            cumulative_work=bdict.get('cumulative_work'),
+            merkle_root=bdict.get('merkle_root')
         )
 
         return block
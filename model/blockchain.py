@@ -1,23 +1,63 @@
 from copy import deepcopy
-from hashlib import sha256
-import os
-import pickle
+from functools import wraps
+from threading import RLock
 
 from network.p2p_server import (broadcast_latest, broadcast_transaction, broadcast_difficult,
                                 connect_to_peer)
 
 from model import Block, Transaction
-from model.transaction import Transaction, get_coinbase_transaction
-from model.wallet import create_transaction, get_balance, get_identifier
+from model.chain import Chain, replace_suffix
+from model.ledger import Ledger
+from model.mempool import Mempool
+from model.merkle import get_merkle_proof
+from model.miner import get_miner
+from model.persistence import (BLOCKS, CHECKPOINT, META, POOL, Persister,
+                               SaveStats)
+from model.proof_of_work import is_valid_proof
+from model.snapshot import Snapshot
+from model.storage import get_store
+from model.transaction import (COINBASE_SENDER, Transaction,
+                               get_coinbase_transaction)
+from model.wallet import create_transaction, get_identifier
 
 BLOCKCHAIN_PATH = './blockchain/'
+CHECKPOINT_INTERVAL = 100  # in blocks
+
+
+def writer(method):
+    """
+    Run a Blockchain method that changes its state holding the writer lock,
+    and publish a new snapshot once the outermost writer returns. The parts
+    changed are only handed to the persistence worker after that, so it
+    never writes a snapshot older than the change.
+    """
+
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            self._writers += 1
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                self._writers -= 1
+                if self._writers == 0:
+                    self.publish()
+
+    return wrapper
 
 
 class Blockchain:
+    """
+    Blocks, transaction pool and peers of the node. The mining thread, the
+    HTTP threads and the P2P loop all use it: changes go through the methods
+    marked as writer, one at a time, and reads go through `snapshot`.
+    """
+
     def __init__(self):
         self.chain = []
         self.block_generation_inverval = 10  # in seconds
         self.difficult_adjustment_interval = 10  # in blocks
+        self.checkpoint_interval = CHECKPOINT_INTERVAL  # in blocks
         self.difficult = 5
         self.nodes = set()
         self.peer_addresses = set()
@@ -31,8 +71,17 @@ class Blockchain:
             proof=1,
             difficult=self.difficult
         )
+        genesis.cumulative_work = Block.get_work(genesis)
         self.chain.append(genesis)
-        self.transaction_pool = []
+        self.transaction_pool = Mempool()
+        self._ledger = None
+        self._lock = RLock()
+        self._writers = 0
+        self._snapshot = None
+        self._persister = None
+        self._unpublished = set()  # parts changed since the last snapshot
+        self._checkpoint = None  # ledger state waiting to be written
+        self._checkpoint_height = 0
 
     def create_block(self, proof: int) -> Block:
         """
@@ -46,9 +95,10 @@ class Blockchain:
             address)
 
         transactions = [coinbase_transaction]
-        transactions.extend(self.transaction_pool)
+        with self._lock:
+            transactions.extend(self.transaction_pool.select())
+            last_block = self.last_block
 
-        last_block = self.last_block
         block = Block(
             index=last_block.index + 1,
             transactions=transactions,
@@ -59,25 +109,119 @@ class Blockchain:
 
         return block
 
+    @writer
     def append_block(self, block: Block) -> bool:
         last_block = self.last_block
         if Block.is_valid_block(block, last_block):
+            block.cumulative_work = self.get_cumulative_work(len(self.chain) - 1) + \
+                Block.get_work(block)
             self.chain.append(block)
-            self.transaction_pool = []
+            confirmed = self.transaction_pool.remove_transactions(
+                block.transactions)
+            if self._ledger is not None:
+                self._ledger.apply_block(block)
+                for transaction in confirmed:
+                    self._ledger.remove_pending(transaction)
+            get_miner().cancel()
             broadcast_latest()
-            self.save_blockchain(self, get_identifier())
+            self.save_blocks()
+            self.update_checkpoint()
             return True
 
         return False
 
-    def append_transaction(self, transaction):
-        self.transaction_pool.append(transaction)
-        self.save_blockchain(self, get_identifier())
+    @writer
+    def append_blocks(self, blocks) -> bool:
+        """
+        Append a batch of blocks following the tip, validating each one
+        against the previous. The batch is written and announced once.
+        :return: <bool> True if all blocks were appended; blocks before the
+        first invalid one are kept.
+        """
 
+        appended = []
+        for block in blocks:
+            last_block = self.last_block
+            if not Block.is_valid_block(block, last_block):
+                break
+
+            block.cumulative_work = self.get_cumulative_work(len(self.chain) - 1) + \
+                Block.get_work(block)
+            self.chain.append(block)
+            appended.append(block)
+
+        if not appended:
+            return False
+
+        for block in appended:
+            confirmed = self.transaction_pool.remove_transactions(
+                block.transactions)
+            if self._ledger is not None:
+                self._ledger.apply_block(block)
+                for transaction in confirmed:
+                    self._ledger.remove_pending(transaction)
+
+        get_miner().cancel()
+        broadcast_latest()
+        self.save_blocks()
+        self.update_checkpoint()
+        return len(appended) == len(blocks)
+
+    @writer
+    def append_transaction(self, transaction) -> bool:
+        """
+        Add a transaction to the pool. Transactions already in the pool or
+        confirmed in a block are ignored.
+        :return: <bool> True if the transaction was added.
+        """
+
+        if self.ledger.is_confirmed(transaction.id):
+            return False
+
+        evicted = self.transaction_pool.add(transaction)
+        if evicted is None:
+            return False
+
+        self._ledger.add_pending(transaction)
+        for other in evicted:
+            self._ledger.remove_pending(other)
+
+        self.save_pool()
+        return True
+
+    @writer
+    def append_transactions(self, transactions) -> list:
+        """
+        Add a batch of transactions received from a peer to the pool, writing
+        the pool once.
+        :return: <list> Transactions added.
+        """
+
+        ledger = self.ledger
+        added = []
+        for transaction in transactions:
+            if ledger.is_confirmed(transaction.id):
+                continue
+
+            evicted = self.transaction_pool.add(transaction)
+            if evicted is None:
+                continue
+
+            ledger.add_pending(transaction)
+            for other in evicted:
+                ledger.remove_pending(other)
+                if other in added:
+                    added.remove(other)
+            added.append(transaction)
+
+        if added:
+            self.save_pool()
+        return added
+
+    @writer
     def send_transaction(self, address: str, amount: int):
-        transactions = self.get_all_transactions()
         transaction = create_transaction(
-            address, get_identifier(), amount, transactions)
+            address, get_identifier(), amount, self.ledger)
 
         if transaction is None:
             return None
@@ -85,27 +229,47 @@ class Blockchain:
         if not self.is_valid_node(address):
             raise RuntimeError("Destinatário não incluso na rede.")
 
-        self.append_transaction(transaction)
+        if not self.append_transaction(transaction):
+            raise RuntimeError("Fila de transações cheia.")
         broadcast_transaction(transaction)
         return transaction
 
     def register_node(self, address):
         connect_to_peer(address)
 
+    @writer
+    def set_nodes(self, nodes):
+        self.nodes = set(nodes)
+        self.save_metadata()
+
+    @writer
+    def remove_node(self, address):
+        self.nodes.discard(address)
+
+    @writer
+    def add_peer_address(self, address):
+        self.peer_addresses.add(address)
+
     def get_nodes(self):
-        return self.nodes
+        return self.snapshot.nodes
 
     def is_valid_node(self, address):
-        return address in self.peer_addresses
+        return address in self.snapshot.peer_addresses
+
+    @writer
+    def set_difficult(self, difficult):
+        self.difficult = difficult
 
     def get_difficult(self):
-        if (self.last_block.index % self.difficult_adjustment_interval == 0
-                and self.last_block.index != 0
-                and self.last_block.difficult == self.difficult):
-            self.adjust_difficult()
+        with self._lock:
+            if (self.last_block.index % self.difficult_adjustment_interval == 0
+                    and self.last_block.index != 0
+                    and self.last_block.difficult == self.difficult):
+                self.adjust_difficult()
 
-        return self.difficult
+            return self.difficult
 
+    @writer
     def adjust_difficult(self):
         previous_adjustment_block = self.chain[-self.difficult_adjustment_interval]
 
@@ -119,27 +283,25 @@ class Blockchain:
             self.difficult -= 1
 
         broadcast_difficult(self.difficult)
-        self.save_blockchain(self, get_identifier())
-
-    @staticmethod
-    def get_accumulated_difficult(chain):
-        return sum([2 ** block.difficult for block in chain])
+        self.save_metadata()
 
     def validate_proof(self, proof, last_proof):
-        hash = sha256(f'{proof * last_proof}'.encode()).hexdigest()
-        difficult = self.get_difficult()
-        return hash[:difficult] == "0" * difficult
+        return is_valid_proof(proof, last_proof, self.get_difficult())
 
     def find_block(self) -> Block:
         """
         Proof of Work algorithm. Try to find a block whose hash matches the
-        current difficult.
-        :return: <Block> Block found.
+        current difficult. The search runs on all the miner workers and is
+        abandoned if the tip changes meanwhile.
+        :return: <Block> Block found, or None if the search was cancelled.
         """
 
-        proof = self.last_block.proof + 1
-        while self.validate_proof(proof, self.last_block.proof) is False:
-            proof += 1
+        last_block = self.last_block
+        difficult = self.get_difficult()
+        proof = get_miner().search(last_block.proof, difficult)
+
+        if proof is None or self.last_block.hash != last_block.hash:
+            return None
 
         block = self.create_block(proof)
         return block
@@ -149,68 +311,341 @@ class Blockchain:
             return
 
         self.mining = True
+        get_miner().reset_hash_rate()
 
         while self.mining:
             block = self.find_block()
-            self.append_block(block)
+            if block is not None:
+                self.append_block(block)
 
     def stop_mining(self):
         self.mining = False
+        get_miner().cancel()
+
+    def get_hash_rate(self) -> float:
+        if not self.mining:
+            return 0.0
+        return get_miner().get_hash_rate()
+
+    @writer
+    def replace_blockchain(self, blockchain):
+        """
+        Adopt the chain of another blockchain if it has more accumulated
+        difficult. Only the blocks after the last block both chains have in
+        common are validated.
+        """
+
+        if blockchain is None:
+            return
 
-    def is_blockchain_valid(self, blockchain):
         chain = blockchain.chain
-        last_block = chain[0]
-        current_index = 1
+        ancestor = self.find_common_ancestor(chain)
+        start = 0 if ancestor is None else ancestor + 1
 
-        while current_index < len(chain):
-            block = chain[current_index]
+        if self.switch_fork(ancestor, chain[start:], blockchain.transaction_pool):
+            self.block_generation_inverval = blockchain.block_generation_inverval
+            self.difficult_adjustment_interval = blockchain.difficult_adjustment_interval
+            self.difficult = blockchain.difficult
+            self.nodes = self.nodes | set(blockchain.nodes)
+            self.peer_addresses = self.peer_addresses | set(blockchain.peer_addresses)
+            self.save_metadata()
 
-            if not Block.is_valid_block(block, last_block):
+        for node in deepcopy(list(self.nodes)):
+            self.register_node(node)
+
+    def find_common_ancestor(self, chain) -> int:
+        """
+        Find the last block this chain has in common with `chain`. The index
+        is part of the block hash, so equal blocks are at the same position
+        and the search only walks back through the divergent blocks.
+        :return: <int> Index of the block in common, or None.
+        """
+
+        index = min(len(self.chain), len(chain)) - 1
+        while index >= 0 and self.chain[index].hash != chain[index].hash:
+            index -= 1
+
+        return index if index >= 0 else None
+
+    def get_cumulative_work(self, index: int) -> int:
+        """
+        :return: <int> Accumulated difficult of the chain up to the block at
+        `index`, inclusive.
+        """
+
+        block = self.chain[index]
+        if block.cumulative_work is not None:
+            return block.cumulative_work
+
+        # Blocos gravados sem o valor: soma a partir do último conhecido.
+        start = index
+        while start > 0 and self.chain[start - 1].cumulative_work is None:
+            start -= 1
+
+        work = self.chain[start - 1].cumulative_work if start > 0 else 0
+        for position in range(start, index + 1):
+            work += Block.get_work(self.chain[position])
+            self.chain[position].cumulative_work = work
+
+        return work
+
+    def get_fork_base(self, ancestor: int) -> Block:
+        """
+        :param ancestor: <int> Index of the last block in common with a fork.
+        :return: <Block> Block at `ancestor`, with its cumulative work, to
+        validate the fork blocks against.
+        """
+
+        with self._lock:
+            self.get_cumulative_work(ancestor)
+            return self.chain[ancestor]
+
+    @staticmethod
+    def validate_blocks(previous_block: Block, blocks) -> bool:
+        """
+        Check that `blocks` form a valid branch following `previous_block`
+        and set their cumulative work.
+        :return: <bool> True if all blocks are valid.
+        """
+
+        for block in blocks:
+            if not Block.is_valid_block(block, previous_block):
                 return False
+            block.cumulative_work = previous_block.cumulative_work + \
+                Block.get_work(block)
+            previous_block = block
+        return True
+
+    @writer
+    def switch_fork(self, ancestor: int, blocks, transactions=None,
+                    validated: bool = False) -> bool:
+        """
+        Replace the blocks after the block at index `ancestor` by `blocks`,
+        if they are valid and have more accumulated difficult than the
+        blocks they replace. Only the divergent blocks are checked, and the
+        accumulated difficult of the current chain comes from the cumulative
+        work stored in its blocks.
+        :param ancestor: <int> Index of the last block in common, or None if
+        the chains have no block in common.
+        :param blocks: <list> Blocks following the common block.
+        :param transactions: <list> Pool transactions of the other chain.
+        :param validated: <bool> The blocks were already checked by
+        validate_blocks against the block at `ancestor`.
+        :return: <bool> True if the chain was replaced.
+        """
 
-            last_block = block
-            current_index += 1
+        blocks = list(blocks)
+        if not blocks:
+            return False
 
+        if validated:
+            # O ancestral pode ter saído da cadeia desde a validação.
+            if ancestor is not None and (
+                    ancestor >= len(self.chain) or
+                    self.chain[ancestor].hash != blocks[0].previous_hash):
+                return False
+            if ancestor is None:
+                ancestor = -1
+        elif ancestor is None:
+            # Sem bloco em comum, as cadeias são comparadas por inteiro.
+            ancestor = -1
+            blocks[0].cumulative_work = Block.get_work(blocks[0])
+            if not self.validate_blocks(blocks[0], blocks[1:]):
+                return False
+        elif not self.validate_blocks(self.get_fork_base(ancestor), blocks):
+            return False
+
+        current_work = self.get_cumulative_work(len(self.chain) - 1)
+        if blocks[-1].cumulative_work <= current_work:
+            return False
+
+        current_blocks = self.chain[ancestor + 1:]
+        chain = replace_suffix(self.chain, ancestor + 1, blocks)
+        self.switch_ledger(chain)
+        if isinstance(self.chain, Chain):
+            # Snapshots publicados continuam lendo os blocos descartados.
+            self.chain.detach(ancestor + 1)
+        self.chain = chain
+
+        # Transações dos blocos descartados voltam para a fila.
+        pool = list(self.transaction_pool) + list(transactions or [])
+        for block in current_blocks:
+            pool.extend([transaction for transaction in block.transactions
+                         if transaction.sender != COINBASE_SENDER])
+        self.transaction_pool = self.get_unconfirmed(pool)
+
+        get_miner().cancel()
+        broadcast_latest()
+        self.save_blocks()
+        self._checkpoint_height = min(self._checkpoint_height, ancestor + 1)
+        self.update_checkpoint()
         return True
 
-    def replace_blockchain(self, blockchain):
+    @writer
+    def restore_blockchain(self, blockchain):
+        """
+        Adopt a blockchain loaded from this node's own storage. Stored blocks
+        were validated before being written, so they are not checked again
+        unless this node already holds blocks of its own.
+        """
+
         if blockchain is None:
             return
 
-        current_nodes = list(self.nodes)
-        current_peer_addresses = list(self.peer_addresses)
-
-        if self.is_blockchain_valid(blockchain) and self.get_accumulated_difficult(blockchain.chain) > self.get_accumulated_difficult(self.chain):
-            self.chain = blockchain.chain
-            self.block_generation_inverval = blockchain.block_generation_inverval
-            self.difficult_adjustment_interval = blockchain.difficult_adjustment_interval
-            self.difficult = blockchain.difficult
-            nodes = list(blockchain.nodes)
-            nodes.extend(current_nodes)
-            self.nodes = set(nodes)
-            peer_addresses = list(blockchain.peer_addresses)
-            peer_addresses.extend(current_peer_addresses)
-            self.peer_addresses = set(peer_addresses)
-            self.transaction_pool = blockchain.transaction_pool
+        if len(self.chain) > 1:
+            self.replace_blockchain(blockchain)
+            return
 
-            self.save_blockchain(self, get_identifier())
+        self.chain = blockchain.chain
+        self.block_generation_inverval = blockchain.block_generation_inverval
+        self.difficult_adjustment_interval = blockchain.difficult_adjustment_interval
+        self.difficult = blockchain.difficult
+        self.nodes = self.nodes | blockchain.nodes
+        self.peer_addresses = self.peer_addresses | blockchain.peer_addresses
+        self.transaction_pool = blockchain.transaction_pool
+        self._ledger = None
+        get_miner().cancel()
 
         for node in deepcopy(list(self.nodes)):
             self.register_node(node)
 
-    def get_account_balance(self):
-        address = get_identifier()
-        transactions = self.get_all_transactions()
+    @property
+    def ledger(self) -> Ledger:
+        """
+        Balances of all addresses. Built from the chain on first use and
+        updated incrementally afterwards.
+        """
+
+        with self._lock:
+            if self._ledger is None:
+                checkpoints = []
+                if isinstance(self.chain, Chain):
+                    checkpoints = self.chain.store.load_checkpoints()
+                self._ledger = Ledger.from_chain(
+                    self.chain, self.transaction_pool, checkpoints)
+                self._checkpoint_height = self._ledger.floor
+            return self._ledger
+
+    @property
+    def snapshot(self) -> Snapshot:
+        """
+        State published by the last change. Readers keep the snapshot for the
+        whole query instead of reading the attributes one by one.
+        """
+
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                self.publish()
+                snapshot = self._snapshot
+        return snapshot
+
+    def publish(self):
+        with self._lock:
+            self._snapshot = Snapshot.from_blockchain(self, self._snapshot)
+            parts = self._unpublished
+            self._unpublished = set()
+            if parts:
+                self.get_persister().mark_dirty(*parts)
+
+    def switch_ledger(self, chain):
+        """
+        Move the ledger to another chain: blocks after the last block both
+        chains have in common are reverted and the new ones applied. The
+        pool balances are updated by get_unconfirmed.
+        """
+
+        if self._ledger is None:
+            return
 
-        result = get_balance(address, transactions)
-        return result
+        height = min(len(self.chain), len(chain))
+        while height > 0 and self.chain[height - 1].hash != chain[height - 1].hash:
+            height -= 1
+
+        if not self._ledger.can_revert(height):
+            # Abaixo do checkpoint: o ledger é reconstruído para a nova cadeia.
+            self._ledger = None
+            return
+
+        for index in range(len(self.chain) - 1, height - 1, -1):
+            self._ledger.revert_block(self.chain[index])
+        for index in range(height, len(chain)):
+            self._ledger.apply_block(chain[index])
+
+    def update_checkpoint(self):
+        """
+        Take a checkpoint of the ledger when the chain reaches a multiple of
+        `checkpoint_interval` blocks since the last one. It is written by the
+        persistence worker after the blocks.
+        """
+
+        height = len(self.chain)
+        if self._ledger is None or height // self.checkpoint_interval <= \
+                self._checkpoint_height // self.checkpoint_interval:
+            return
+
+        self._checkpoint = self._ledger.to_checkpoint(
+            height, self.last_block.hash)
+        self._checkpoint_height = height
+        self.schedule_save(CHECKPOINT)
+
+    def get_unconfirmed(self, transactions) -> Mempool:
+        """
+        Build a pool with the transactions not confirmed in the chain.
+        """
+
+        ledger = self.ledger
+        transaction_pool = Mempool()
+        for transaction in transactions:
+            if not ledger.is_confirmed(transaction.id):
+                transaction_pool.add(transaction)
+
+        ledger.set_pending(transaction_pool)
+        return transaction_pool
+
+    def get_transaction_proof(self, transaction_id: str) -> dict:
+        """
+        Build the inclusion proof of a confirmed transaction: the header of
+        its block and the Merkle path from the transaction to the root.
+        :param transaction_id: <str> Id of the transaction.
+        :return: <dict> The proof, or None if the transaction is not
+        confirmed or its block has no Merkle root.
+        """
+
+        snapshot = self.snapshot
+        index = snapshot.get_block_index(transaction_id)
+        if index is None:
+            return None
+
+        block = snapshot.chain[index]
+        if getattr(block, 'merkle_root', None) is None:
+            return None
+
+        for position, transaction in enumerate(block.transactions):
+            if transaction.id == transaction_id:
+                return {
+                    'transaction_id': transaction_id,
+                    'transaction': transaction,
+                    'header': Block.get_header(block),
+                    'position': position,
+                    'proof': get_merkle_proof(block.transactions, position)
+                }
+
+        return None
+
+    def get_balance(self, address: str) -> int:
+        return self.snapshot.get_balance(address)
+
+    def get_account_balance(self):
+        return self.get_balance(get_identifier())
 
     def get_all_transactions(self):
+        snapshot = self.snapshot
         transactions = []
-        for block in self.chain:
+        for block in snapshot.chain:
             transactions.extend(block.transactions)
 
-        transactions.extend(self.transaction_pool)
+        transactions.extend(snapshot.transaction_pool)
 
         return transactions
 
@@ -218,6 +653,39 @@ class Blockchain:
     def last_block(self) -> Block:
         return self.chain[-1]
 
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        for name in ('_lock', '_writers', '_snapshot', '_persister',
+                     '_unpublished'):
+            state.pop(name, None)
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self._lock = RLock()
+        self._writers = 0
+        self._snapshot = None
+        self._persister = None
+        self._unpublished = set()
+        self._ledger = state.get('_ledger')
+        self.checkpoint_interval = state.get('checkpoint_interval',
+                                             CHECKPOINT_INTERVAL)
+        self._checkpoint = state.get('_checkpoint')
+        self._checkpoint_height = state.get('_checkpoint_height', 0)
+
+    def to_dict(self) -> dict:
+        snapshot = self.snapshot
+        return {
+            'chain': snapshot.chain,
+            'block_generation_inverval': self.block_generation_inverval,
+            'difficult_adjustment_interval': self.difficult_adjustment_interval,
+            'difficult': snapshot.difficult,
+            'nodes': snapshot.nodes,
+            'peer_addresses': snapshot.peer_addresses,
+            'mining': self.mining,
+            'transaction_pool': list(snapshot.transaction_pool)
+        }
+
     @staticmethod
     def from_dict(bcdict):
         blockchain = Blockchain()
@@ -229,27 +697,145 @@ class Blockchain:
         blockchain.mining = False
         blockchain.chain = [Block.from_dict(bdict)
                             for bdict in bcdict['chain']]
-        blockchain.transaction_pool = [Transaction.from_dict(
-            tr) for tr in bcdict['transaction_pool']]
+        blockchain.transaction_pool = Mempool.from_transactions(
+            [Transaction.from_dict(tr) for tr in bcdict['transaction_pool']])
 
         return blockchain
 
-    @staticmethod
-    def save_blockchain(blockchain, node_identifier):
-        path = f'{BLOCKCHAIN_PATH}{node_identifier}'
+    def get_metadata(self, snapshot: Snapshot = None) -> dict:
+        state = self if snapshot is None else snapshot
+        return {
+            'block_generation_inverval': self.block_generation_inverval,
+            'difficult_adjustment_interval': self.difficult_adjustment_interval,
+            'difficult': state.difficult,
+            'nodes': state.nodes,
+            'peer_addresses': state.peer_addresses
+        }
+
+    def get_persister(self) -> Persister:
+        with self._lock:
+            if self._persister is None:
+                self._persister = Persister(self.save)
+            return self._persister
+
+    def schedule_save(self, *parts):
+        """
+        Schedule parts of the node state to be written by the persistence
+        worker once the change is published. Outside a writer it is
+        published now.
+        :param parts: <str> Parts to write, from model.persistence.
+        """
+
+        with self._lock:
+            self._unpublished.update(parts)
+            if self._writers == 0:
+                self.publish()
+
+    def save_blocks(self):
+        """
+        Schedule the blocks not stored yet and the transaction pool to be
+        written by the persistence worker.
+        """
+
+        self.schedule_save(BLOCKS, POOL)
+
+    def save_pool(self):
+        self.schedule_save(POOL)
+
+    def save_metadata(self):
+        self.schedule_save(META)
+
+    def save(self, parts):
+        """
+        Write the given parts of the last published snapshot: the blocks not
+        stored yet, the transaction pool and the metadata.
+        :param parts: <set> Parts to write, from model.persistence.
+        """
+
+        snapshot = self.snapshot
+        store = get_store(f'{BLOCKCHAIN_PATH}{get_identifier()}')
+
+        if BLOCKS in parts:
+            store.sync_chain(snapshot.chain)
+        if POOL in parts:
+            store.save_pool(snapshot.transaction_pool)
+        if META in parts:
+            store.save_meta(self.get_metadata(snapshot))
+        if CHECKPOINT in parts:
+            with self._lock:
+                checkpoint = self._checkpoint
+            if checkpoint is not None:
+                store.save_checkpoint(checkpoint)
+                with self._lock:
+                    # Um checkpoint mais novo pode ter sido tirado enquanto
+                    # este era gravado.
+                    if self._checkpoint is checkpoint:
+                        self._checkpoint = None
+
+        if BLOCKS in parts:
+            with self._lock:
+                self.release_blocks(store)
+
+    def flush(self):
+        """
+        Write the pending changes now.
+        """
+
+        if self._persister is not None:
+            self._persister.flush()
+
+    def close(self):
+        """
+        Write the pending changes and stop the persistence worker.
+        """
+
+        with self._lock:
+            persister = self._persister
+            self._persister = None
+        if persister is not None:
+            persister.close()
+
+    def get_persistence_stats(self) -> dict:
+        if self._persister is None:
+            return SaveStats().to_dict()
+        return self._persister.stats.to_dict()
 
-        if not os.path.exists(path):
-            os.makedirs(path)
+    def release_blocks(self, store):
+        """
+        Back the chain by the store once its blocks are written, so only
+        recently used blocks stay in memory.
+        """
+
+        if not isinstance(self.chain, Chain) or self.chain.store is not store:
+            self.chain = Chain(store, stored=0, blocks=self.chain)
+        self.chain.release()
 
-        file = f'{path}/chain'
-        with open(file, 'wb') as blockchain_file:
-            pickle.dump(blockchain, blockchain_file)
+    @staticmethod
+    def save_blockchain(blockchain, node_identifier):
+        store = get_store(f'{BLOCKCHAIN_PATH}{node_identifier}')
+        store.sync_chain(blockchain.chain)
+        store.save_pool(blockchain.transaction_pool)
+        store.save_meta(blockchain.get_metadata())
+        blockchain.release_blocks(store)
 
     @staticmethod
     def load_blockchain(node_identifier):
-        file = f'{BLOCKCHAIN_PATH}{node_identifier}/chain'
-        try:
-            with open(file, 'rb') as blockchain_file:
-                return pickle.load(blockchain_file)
-        except:
+        store = get_store(f'{BLOCKCHAIN_PATH}{node_identifier}')
+        store.migrate_legacy()
+
+        if store.height == 0:
             return None
+
+        blockchain = Blockchain()
+        meta = store.load_meta()
+        if meta is not None:
+            blockchain.block_generation_inverval = meta['block_generation_inverval']
+            blockchain.difficult_adjustment_interval = meta['difficult_adjustment_interval']
+            blockchain.difficult = meta['difficult']
+            blockchain.nodes = set(meta['nodes'])
+            blockchain.peer_addresses = set(meta['peer_addresses'])
+        blockchain.chain = Chain(store)
+        blockchain.transaction_pool = Mempool.from_transactions(
+            store.load_pool())
+
+        return blockchain
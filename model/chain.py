@@ -0,0 +1,232 @@
+from collections import OrderedDict
+from collections.abc import Sequence
+from itertools import islice
+from threading import Lock
+
+from model.block import Block
+
+CACHE_SIZE = 256  # stored blocks kept decoded in memory
+
+
+class Chain(Sequence):
+    """
+    Sequence of blocks backed by a BlockStore. The first `stored` blocks are
+    read from the store on access and kept in a bounded cache; blocks
+    appended afterwards stay in memory until they are stored.
+    """
+
+    def __init__(self, store, stored: int = None, blocks=None):
+        self.store = store
+        stored = store.height if stored is None else stored
+        blocks = list(blocks) if blocks is not None else []
+        # Both parts are replaced together so readers never see them torn.
+        self._parts = (stored, blocks)
+        self._cache = OrderedDict()
+        self._cache_lock = Lock()
+
+    @property
+    def stored(self) -> int:
+        return self._parts[0]
+
+    def __len__(self) -> int:
+        stored, blocks = self._parts
+        return stored + len(blocks)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        stored, blocks = self._parts
+        length = stored + len(blocks)
+        if index < 0:
+            index += length
+        if index < 0 or index >= length:
+            raise IndexError('chain index out of range')
+
+        if index >= stored:
+            return blocks[index - stored]
+
+        with self._cache_lock:
+            block = self._cache.get(index)
+            if block is not None:
+                self._cache.move_to_end(index)
+                return block
+
+        block = self.store.read_block(index)
+        with self._cache_lock:
+            self._cache[index] = block
+            if len(self._cache) > CACHE_SIZE:
+                self._cache.popitem(last=False)
+
+        return block
+
+    def __iter__(self):
+        stored, blocks = self._parts
+        for index in range(stored):
+            block = self._cache.get(index)
+            yield block if block is not None else self.store.read_block(index)
+        yield from blocks[:]
+
+    def __reduce__(self):
+        return (list, (list(self),))
+
+    def append(self, block: Block):
+        self._parts[1].append(block)
+
+    def index_of(self, hash: str) -> int:
+        """
+        :return: <int> Index of the block with the given hash, or None.
+        """
+
+        stored, blocks = self._parts
+        for position, block in enumerate(blocks):
+            if block.hash == hash:
+                return stored + position
+
+        index = self.store.find(hash)
+        if index is not None and index < stored:
+            return index
+
+        return None
+
+    def release(self):
+        """
+        Drop the in-memory blocks that are already in the store, so they are
+        read back from it when needed.
+        """
+
+        stored, blocks = self._parts
+        height = min(self.store.height, stored + len(blocks))
+        if height <= stored or \
+                self.store.get_hash(height - 1) != self[height - 1].hash:
+            return
+
+        with self._cache_lock:
+            for index in range(max(stored, height - CACHE_SIZE), height):
+                self._cache[index] = blocks[index - stored]
+            while len(self._cache) > CACHE_SIZE:
+                self._cache.popitem(last=False)
+
+        self._parts = (height, blocks[height - stored:])
+
+    def detach(self, height: int):
+        """
+        Read the stored blocks from `height` on back into memory, before the
+        store replaces them with the blocks of another fork, so views of this
+        chain keep seeing its own blocks.
+        """
+
+        stored, blocks = self._parts
+        if height >= stored:
+            return
+
+        detached = [self[index] for index in range(height, stored)]
+        self._parts = (height, detached + blocks)
+
+
+class ChainView(Sequence):
+    """
+    Read-only view of the first `length` blocks of a chain. Blocks appended
+    to the chain later are not part of the view, and a fork replaces the
+    chain instead of changing it, so the view never changes.
+    """
+
+    __slots__ = ('_chain', '_length')
+
+    def __init__(self, chain, length: int = None):
+        if isinstance(chain, ChainView):
+            chain = chain._chain
+        self._chain = chain
+        self._length = len(chain) if length is None else length
+
+    @property
+    def chain(self):
+        return self._chain
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._chain[i] for i in range(*index.indices(self._length))]
+
+        if index < 0:
+            index += self._length
+        if index < 0 or index >= self._length:
+            raise IndexError('chain index out of range')
+
+        return self._chain[index]
+
+    def __iter__(self):
+        return islice(self._chain, self._length)
+
+    def __reduce__(self):
+        return (list, (list(self),))
+
+    def index_of(self, hash: str) -> int:
+        index = find_block_index(self._chain, hash)
+        return index if index is not None and index < self._length else None
+
+
+def find_block_index(chain, hash: str) -> int:
+    """
+    :return: <int> Index of the block with the given hash in `chain`, or None.
+    """
+
+    if isinstance(chain, (Chain, ChainView)):
+        return chain.index_of(hash)
+
+    for index in range(len(chain) - 1, -1, -1):
+        if chain[index].hash == hash:
+            return index
+
+    return None
+
+
+def get_locator(chain):
+    """
+    Hashes of the blocks at the tip, tip - 1, tip - 2, tip - 4, ... and
+    genesis, so a peer can find the last block both chains have in common
+    with O(log n) hashes.
+    """
+
+    locator = []
+    index = len(chain) - 1
+    step = 1
+    while index > 0:
+        locator.append(chain[index].hash)
+        if len(locator) > 1:
+            step *= 2
+        index -= step
+
+    locator.append(chain[0].hash)
+    return locator
+
+
+def find_ancestor(chain, locator) -> int:
+    """
+    :return: <int> Index of the first locator hash found in `chain`, or None.
+    """
+
+    for hash in locator:
+        index = find_block_index(chain, hash)
+        if index is not None:
+            return index
+
+    return None
+
+
+def replace_suffix(chain, height: int, blocks):
+    """
+    :return: A chain with the first `height` blocks of `chain` followed by
+    `blocks`.
+    """
+
+    if isinstance(chain, Chain):
+        stored, stored_blocks = chain._parts
+        if height <= stored:
+            return Chain(chain.store, stored=height, blocks=blocks)
+        return Chain(chain.store, stored=stored,
+                     blocks=stored_blocks[:height - stored] + list(blocks))
+
+    return list(chain[:height]) + list(blocks)
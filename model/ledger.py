@@ -0,0 +1,184 @@
+from model.block import Block
+from model.transaction import COINBASE_SENDER, Transaction
+
+
+class Ledger:
+    """
+    Balance and time of the last transaction sent of every address, kept up
+    to date as blocks and pool transactions are applied, so they are read
+    without scanning the chain.
+    """
+
+    def __init__(self):
+        self.balances = {}  # confirmed balances, from the blocks
+        self.pending = {}  # balance changes of the transaction pool
+        # Por remetente, o maior timestamp após cada transação confirmada,
+        # para que reverter um bloco apenas desempilhe valores.
+        self.sent = {}
+        self.pending_sent = {}  # timestamps of the pool transactions
+        self.confirmed = {}  # block index by transaction id
+        # Chaves alteradas desde o último snapshot, para que ele copie só
+        # o que mudou.
+        self.changed_balances = set()
+        self.changed_pending = set()
+        self.changed_confirmed = set()
+        # Blocos abaixo do checkpoint carregado não podem ser revertidos:
+        # o checkpoint guarda só o último envio de cada remetente.
+        self.floor = 0
+
+    @staticmethod
+    def _apply(balances: dict, transaction: Transaction, sign: int = 1,
+               changed: set = None):
+        # Mesma regra de wallet.get_balance: uma transação para si mesmo
+        # conta apenas como envio.
+        amount = sign * transaction.amount
+        sender = transaction.sender
+        balances[sender] = balances.get(sender, 0) - amount
+        if transaction.receiver != sender:
+            receiver = transaction.receiver
+            balances[receiver] = balances.get(receiver, 0) + amount
+
+        if changed is not None:
+            changed.add(sender)
+            changed.add(transaction.receiver)
+
+    def apply_block(self, block: Block):
+        for transaction in block.transactions:
+            self._apply(self.balances, transaction,
+                        changed=self.changed_balances)
+            self.confirmed[transaction.id] = block.index
+            self.changed_confirmed.add(transaction.id)
+
+            if transaction.sender != COINBASE_SENDER:
+                sent = self.sent.setdefault(transaction.sender, [])
+                last = sent[-1] if sent else transaction.timestamp
+                sent.append(max(last, transaction.timestamp))
+
+    def revert_block(self, block: Block):
+        for transaction in reversed(block.transactions):
+            self._apply(self.balances, transaction, -1,
+                        self.changed_balances)
+            self.confirmed.pop(transaction.id, None)
+            self.changed_confirmed.add(transaction.id)
+
+            if transaction.sender != COINBASE_SENDER:
+                sent = self.sent[transaction.sender]
+                sent.pop()
+                if not sent:
+                    del self.sent[transaction.sender]
+
+    def add_pending(self, transaction: Transaction):
+        self._apply(self.pending, transaction, changed=self.changed_pending)
+        self.pending_sent.setdefault(
+            transaction.sender, []).append(transaction.timestamp)
+
+    def remove_pending(self, transaction: Transaction):
+        self._apply(self.pending, transaction, -1, self.changed_pending)
+
+        sent = self.pending_sent.get(transaction.sender, [])
+        if transaction.timestamp in sent:
+            sent.remove(transaction.timestamp)
+        if not sent:
+            self.pending_sent.pop(transaction.sender, None)
+
+    def set_pending(self, transactions):
+        self.pending = {}
+        self.pending_sent = {}
+        for transaction in transactions:
+            self.add_pending(transaction)
+
+    def take_changes(self) -> tuple:
+        """
+        :return: <tuple> Keys of the balances, the pending balances and the
+        confirmed transactions changed since the last call.
+        """
+
+        changes = (self.changed_balances, self.changed_pending,
+                   self.changed_confirmed)
+        self.changed_balances = set()
+        self.changed_pending = set()
+        self.changed_confirmed = set()
+        return changes
+
+    def is_confirmed(self, transaction_id: str) -> bool:
+        return transaction_id in self.confirmed
+
+    def get_balance(self, address: str) -> int:
+        return self.balances.get(address, 0) + self.pending.get(address, 0)
+
+    def get_last_sent(self, address: str) -> float:
+        """
+        :return: <float> Timestamp of the newest transaction sent by
+        `address`, confirmed or in the pool, or None if it never sent one.
+        """
+
+        sent = self.sent.get(address)
+        pending_sent = self.pending_sent.get(address)
+
+        timestamps = []
+        if sent:
+            timestamps.append(sent[-1])
+        if pending_sent:
+            timestamps.append(max(pending_sent))
+
+        return max(timestamps) if timestamps else None
+
+    def can_revert(self, height: int) -> bool:
+        """
+        :return: <bool> True if the blocks from `height` on can be reverted.
+        """
+
+        return height >= self.floor
+
+    def to_checkpoint(self, height: int, tip_hash: str) -> dict:
+        """
+        :return: <dict> Confirmed state after the first `height` blocks, the
+        last of them with hash `tip_hash`.
+        """
+
+        return {
+            'height': height,
+            'tip_hash': tip_hash,
+            'balances': dict(self.balances),
+            'sent': {sender: sent[-1] for sender, sent in self.sent.items()},
+            'confirmed': dict(self.confirmed)
+        }
+
+    @staticmethod
+    def from_checkpoint(state: dict) -> 'Ledger':
+        ledger = Ledger()
+        ledger.balances = dict(state['balances'])
+        ledger.sent = {sender: [timestamp]
+                       for sender, timestamp in state['sent'].items()}
+        ledger.confirmed = dict(state['confirmed'])
+        ledger.floor = state['height']
+        return ledger
+
+    @staticmethod
+    def from_chain(chain, transaction_pool, checkpoints=()) -> 'Ledger':
+        """
+        Build the ledger of `chain`, starting from the newest checkpoint that
+        belongs to it, or replaying every block if none does.
+        :param checkpoints: <iterable> Checkpoint states, newest first.
+        """
+
+        ledger = None
+        for state in checkpoints:
+            height = state.get('height', 0)
+            if 0 < height <= len(chain) and \
+                    chain[height - 1].hash == state.get('tip_hash'):
+                try:
+                    ledger = Ledger.from_checkpoint(state)
+                except (KeyError, TypeError, AttributeError):
+                    continue
+                break
+
+        if ledger is None:
+            ledger = Ledger()
+
+        for index in range(ledger.floor, len(chain)):
+            ledger.apply_block(chain[index])
+        ledger.set_pending(transaction_pool)
+        # O primeiro snapshot de um ledger novo copia tudo.
+        ledger.take_changes()
+        return ledger
@@ -0,0 +1,164 @@
+import heapq
+from itertools import count
+
+from model.transaction import Transaction
+
+MAX_POOL_TRANSACTIONS = 5000
+MAX_POOL_SIZE = 2 * 1024 * 1024  # in bytes
+MAX_BLOCK_TRANSACTIONS = 1000
+
+
+def by_age(transaction: Transaction) -> float:
+    """
+    Default priority: older transactions are included in blocks first and
+    the newest ones are evicted first.
+    """
+
+    return -transaction.timestamp
+
+
+def get_transaction_size(transaction: Transaction) -> int:
+    # Endereços e valores numéricos, como trafegam na rede.
+    return len(transaction.sender) + len(transaction.receiver) + 16
+
+
+class Mempool:
+    """
+    Pool of transactions waiting for a block. Transactions are indexed by id,
+    so duplicates are ignored, and the pool is capped by number of
+    transactions and by size: once full, the transactions with the lowest
+    priority are evicted.
+    """
+
+    def __init__(
+            self,
+            max_count: int = MAX_POOL_TRANSACTIONS,
+            max_size: int = MAX_POOL_SIZE,
+            priority=by_age):
+        self.max_count = max_count
+        self.max_size = max_size
+        self.priority = priority
+        self.size = 0
+        self._transactions = {}
+        self._heap = []  # (priority, order, id); removed ids are skipped
+        self._order = count()
+        self._changed = set()  # ids added or removed since the last snapshot
+
+    def __len__(self) -> int:
+        return len(self._transactions)
+
+    def __contains__(self, transaction_id: str) -> bool:
+        return transaction_id in self._transactions
+
+    def __iter__(self):
+        return iter(list(self._transactions.values()))
+
+    def get(self, transaction_id: str) -> Transaction:
+        return self._transactions.get(transaction_id)
+
+    @property
+    def transactions(self) -> dict:
+        """
+        Transactions by id, in insertion order. Not to be modified.
+        """
+
+        return self._transactions
+
+    def take_changes(self) -> set:
+        """
+        :return: <set> Ids of the transactions added or removed since the
+        last call.
+        """
+
+        changed = self._changed
+        self._changed = set()
+        return changed
+
+    def add(self, transaction: Transaction):
+        """
+        Add a transaction, evicting lower priority transactions if the pool
+        is full.
+        :return: <list> Transactions evicted, or None if the transaction was
+        not added because it is already in the pool or the pool is full of
+        transactions with a higher priority.
+        """
+
+        if transaction.id in self._transactions:
+            return None
+
+        size = get_transaction_size(transaction)
+        priority = self.priority(transaction)
+
+        evicted = []
+        while len(self._transactions) + 1 > self.max_count or \
+                self.size + size > self.max_size:
+            lowest = self._peek_lowest()
+            if lowest is None or self.priority(lowest) >= priority:
+                for other in evicted:
+                    self._insert(other)
+                return None
+
+            evicted.append(self.remove(lowest.id))
+
+        self._insert(transaction)
+        return evicted
+
+    def _insert(self, transaction: Transaction):
+        self._transactions[transaction.id] = transaction
+        self._changed.add(transaction.id)
+        self.size += get_transaction_size(transaction)
+        heapq.heappush(self._heap, (self.priority(transaction),
+                                    next(self._order), transaction.id))
+
+    def _peek_lowest(self) -> Transaction:
+        while self._heap:
+            transaction = self._transactions.get(self._heap[0][2])
+            if transaction is not None:
+                return transaction
+            heapq.heappop(self._heap)
+        return None
+
+    def remove(self, transaction_id: str) -> Transaction:
+        transaction = self._transactions.pop(transaction_id, None)
+        if transaction is not None:
+            self._changed.add(transaction_id)
+            self.size -= get_transaction_size(transaction)
+
+        # Entradas removidas continuam no heap até serem descartadas; o heap
+        # é reconstruído quando elas passam a ser a maioria.
+        if len(self._heap) > 2 * len(self._transactions) + 64:
+            self._heap = [entry for entry in self._heap
+                          if entry[2] in self._transactions]
+            heapq.heapify(self._heap)
+
+        return transaction
+
+    def remove_transactions(self, transactions):
+        """
+        Remove the given transactions, e.g. once they are confirmed in a
+        block.
+        :return: <list> Transactions that were in the pool.
+        """
+
+        removed = []
+        for transaction in transactions:
+            pooled = self.remove(transaction.id)
+            if pooled is not None:
+                removed.append(pooled)
+        return removed
+
+    def select(self, limit: int = MAX_BLOCK_TRANSACTIONS):
+        """
+        :return: <list> Up to `limit` transactions, highest priority first,
+        to be included in a block.
+        """
+
+        return heapq.nlargest(limit, self._transactions.values(),
+                              key=self.priority)
+
+    @staticmethod
+    def from_transactions(transactions, **kwargs) -> 'Mempool':
+        mempool = Mempool(**kwargs)
+        for transaction in transactions:
+            mempool.add(transaction)
+        return mempool
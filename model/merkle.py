@@ -0,0 +1,90 @@
+from hashlib import sha256
+from typing import List
+
+LEFT = 'left'
+RIGHT = 'right'
+
+EMPTY_ROOT = sha256(b'').hexdigest()
+
+
+def hash_pair(left: str, right: str) -> str:
+    return sha256(bytes.fromhex(left) + bytes.fromhex(right)).hexdigest()
+
+
+def get_next_level(level: List[str]) -> List[str]:
+    # Em um nível com quantidade ímpar, o último hash é pareado consigo mesmo.
+    if len(level) % 2 == 1:
+        level = level + [level[-1]]
+
+    return [hash_pair(level[i], level[i + 1])
+            for i in range(0, len(level), 2)]
+
+
+def get_merkle_root(transactions) -> str:
+    """
+    Compute the Merkle root of a list of transactions.
+    :param transactions: <list> Transactions, in block order.
+    :return: <str> The root hash.
+    """
+
+    level = [transaction.id for transaction in transactions]
+    if not level:
+        return EMPTY_ROOT
+
+    while len(level) > 1:
+        level = get_next_level(level)
+
+    return level[0]
+
+
+def get_merkle_proof(transactions, index: int) -> List[dict]:
+    """
+    Build the inclusion proof of the transaction at `index`: the sibling
+    hash of each level, from the leaves to the root.
+    :param transactions: <list> Transactions of the block, in block order.
+    :param index: <int> Position of the transaction in the block.
+    :return: <list> Steps of the proof, each with the sibling `hash` and
+    its `position`, left or right.
+    """
+
+    level = [transaction.id for transaction in transactions]
+    proof = []
+
+    while len(level) > 1:
+        if len(level) % 2 == 1:
+            level = level + [level[-1]]
+
+        if index % 2 == 0:
+            proof.append({'hash': level[index + 1], 'position': RIGHT})
+        else:
+            proof.append({'hash': level[index - 1], 'position': LEFT})
+
+        level = get_next_level(level)
+        index //= 2
+
+    return proof
+
+
+def verify_merkle_proof(transaction_id: str, proof: List[dict],
+                        merkle_root: str) -> bool:
+    """
+    Checks an inclusion proof.
+    :param transaction_id: <str> Id of the transaction.
+    :param proof: <list> Proof returned by get_merkle_proof.
+    :param merkle_root: <str> Merkle root of the block header.
+    :return: <bool> True if the transaction is part of the block.
+    """
+
+    try:
+        current = transaction_id
+        for step in proof:
+            if step['position'] == LEFT:
+                current = hash_pair(step['hash'], current)
+            elif step['position'] == RIGHT:
+                current = hash_pair(current, step['hash'])
+            else:
+                return False
+    except (KeyError, TypeError, ValueError):
+        return False
+
+    return current == merkle_root
@@ -0,0 +1,171 @@
+import multiprocessing
+import os
+import queue
+import time
+from threading import Lock
+
+from model.proof_of_work import get_target, search_batch
+
+BATCH_SIZE = 5000  # nonces tested between two cancellation checks
+POLL_INTERVAL = 0.05  # in seconds
+
+
+def _search_worker(tasks, results, generation, hashes):
+    """
+    Worker process loop. Each task is a slice of the nonce space, defined by a
+    start value and a stride, and is abandoned as soon as the shared
+    generation counter changes.
+    """
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+
+        task_generation, last_proof, difficult, start, stride = task
+        target = get_target(difficult)
+        proof = start
+
+        while generation.value == task_generation:
+            found = search_batch(last_proof, target, proof, BATCH_SIZE, stride)
+
+            # Um lote que encontra a prova termina no nonce encontrado.
+            tried = BATCH_SIZE if found is None \
+                else (found - proof) // stride + 1
+            with hashes.get_lock():
+                hashes.value += tried
+
+            if found is not None:
+                results.put((task_generation, found))
+                break
+
+            proof += BATCH_SIZE * stride
+
+
+class ParallelMiner:
+    """
+    Proof of Work engine that splits the nonce space across a pool of worker
+    processes. Workers are started on the first search and kept alive between
+    blocks; a search is cancelled by bumping a shared generation counter.
+    """
+
+    def __init__(self, workers: int = None):
+        self.workers = workers if workers is not None else os.cpu_count() or 1
+        self._context = multiprocessing.get_context('spawn')
+        self._lock = Lock()
+        self._processes = []
+        self._tasks = None
+        self._results = None
+        self._generation = None
+        self._hashes = None
+        self._started_at = None
+        self._start_hashes = 0
+
+    def start(self):
+        with self._lock:
+            if self._processes:
+                return
+
+            self._tasks = self._context.Queue()
+            self._results = self._context.Queue()
+            self._generation = self._context.Value('Q', 0)
+            self._hashes = self._context.Value('Q', 0)
+
+            for _ in range(self.workers):
+                process = self._context.Process(
+                    target=_search_worker,
+                    args=(self._tasks, self._results,
+                          self._generation, self._hashes),
+                    daemon=True)
+                process.start()
+                self._processes.append(process)
+
+    def shutdown(self):
+        with self._lock:
+            if not self._processes:
+                return
+
+            self._bump_generation()
+            for _ in self._processes:
+                self._tasks.put(None)
+            for process in self._processes:
+                process.join(timeout=1)
+            self._processes = []
+
+    def search(self, last_proof: int, difficult: int) -> int:
+        """
+        Search a proof for the block following the one with proof `last_proof`.
+        Blocks the caller until a proof is found or the search is cancelled.
+        :param last_proof: <int> Proof of the current tip.
+        :param difficult: <int> Number of leading zeros required.
+        :return: <int> Proof found, or None if the search was cancelled.
+        """
+
+        self.start()
+
+        generation = self._bump_generation()
+        for i in range(self.workers):
+            self._tasks.put((generation, last_proof, difficult,
+                             last_proof + 1 + i, self.workers))
+
+        while self._generation.value == generation:
+            try:
+                task_generation, proof = self._results.get(
+                    timeout=POLL_INTERVAL)
+            except queue.Empty:
+                continue
+
+            if task_generation == generation:
+                self.cancel()
+                return proof
+
+        return None
+
+    def cancel(self):
+        """
+        Stop the running search, if any. Called whenever the tip changes so
+        workers restart on the new block template.
+        """
+
+        if self._generation is not None:
+            self._bump_generation()
+
+    def _bump_generation(self) -> int:
+        with self._generation.get_lock():
+            self._generation.value += 1
+            return self._generation.value
+
+    def reset_hash_rate(self):
+        self._started_at = time.time()
+        self._start_hashes = self.hashes
+
+    @property
+    def hashes(self) -> int:
+        if self._hashes is None:
+            return 0
+        return self._hashes.value
+
+    def get_hash_rate(self) -> float:
+        """
+        Aggregate hash rate of all workers since the last reset.
+        :return: <float> Hashes per second.
+        """
+
+        if self._started_at is None:
+            return 0.0
+
+        elapsed = time.time() - self._started_at
+        if elapsed <= 0:
+            return 0.0
+
+        return (self.hashes - self._start_hashes) / elapsed
+
+
+_miner = None
+
+
+def get_miner() -> ParallelMiner:
+    global _miner
+    if _miner is None:
+        _miner = ParallelMiner()
+    return _miner
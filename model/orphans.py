@@ -0,0 +1,103 @@
+import time
+from collections import OrderedDict
+
+from model.block import Block
+
+MAX_ORPHANS = 100
+MAX_ORPHAN_AGE = 600  # in seconds
+
+
+class OrphanPool:
+    """
+    Blocks received before their parent, indexed by hash and by the hash of
+    the parent so they are connected as soon as the parent arrives. The pool
+    is capped by number of blocks, dropping the oldest first, and blocks
+    older than `max_age` expire.
+    """
+
+    def __init__(self, max_count: int = MAX_ORPHANS,
+                 max_age: float = MAX_ORPHAN_AGE):
+        self.max_count = max_count
+        self.max_age = max_age
+        self._blocks = OrderedDict()  # (block, received_at) by hash
+        self._children = {}  # hashes of the blocks by previous hash
+
+    def __len__(self) -> int:
+        return len(self._blocks)
+
+    def __contains__(self, hash: str) -> bool:
+        return hash in self._blocks
+
+    def get(self, hash: str) -> Block:
+        entry = self._blocks.get(hash)
+        return entry[0] if entry is not None else None
+
+    def add(self, block: Block) -> bool:
+        """
+        :return: <bool> True if the block was added, False if it is already
+        in the pool.
+        """
+
+        self.expire()
+
+        if block.hash in self._blocks:
+            return False
+
+        while len(self._blocks) >= self.max_count:
+            self.remove(next(iter(self._blocks)))
+
+        self._blocks[block.hash] = (block, time.monotonic())
+        self._children.setdefault(block.previous_hash, set()).add(block.hash)
+        return True
+
+    def remove(self, hash: str) -> Block:
+        entry = self._blocks.pop(hash, None)
+        if entry is None:
+            return None
+
+        block = entry[0]
+        children = self._children.get(block.previous_hash)
+        if children is not None:
+            children.discard(hash)
+            if not children:
+                del self._children[block.previous_hash]
+
+        return block
+
+    def expire(self):
+        limit = time.monotonic() - self.max_age
+        while self._blocks:
+            hash, (_, received_at) = next(iter(self._blocks.items()))
+            if received_at > limit:
+                break
+            self.remove(hash)
+
+    def get_children(self, hash: str):
+        return [self._blocks[child][0]
+                for child in self._children.get(hash, ())]
+
+    def get_path(self, block: Block):
+        """
+        :return: <list> The blocks of the pool `block` descends from, oldest
+        first, followed by `block`. The parent of the first block is the
+        missing one.
+        """
+
+        path = [block]
+        while path[0].previous_hash in self._blocks and \
+                len(path) <= len(self._blocks):
+            path.insert(0, self.get(path[0].previous_hash))
+        return path
+
+    def get_branch(self, hash: str):
+        """
+        :return: <list> The longest sequence of blocks of the pool descending
+        from the block with the given hash, oldest first.
+        """
+
+        best = []
+        for child in self.get_children(hash):
+            branch = [child] + self.get_branch(child.hash)
+            if len(branch) > len(best):
+                best = branch
+        return best
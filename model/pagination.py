@@ -0,0 +1,176 @@
+from model.block import Block
+from model.chain import find_block_index
+from model.transaction import Transaction
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def get_page_size(limit) -> int:
+    """
+    :param limit: <str> Page size requested, may be None.
+    :return: <int> The page size, capped at MAX_PAGE_SIZE.
+    """
+
+    if limit is None or limit == '':
+        return DEFAULT_PAGE_SIZE
+
+    limit = int(limit)
+    if limit < 1:
+        raise ValueError('limit must be positive')
+
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def get_transaction_entry(transaction: Transaction, block_index: int = None) -> dict:
+    entry = transaction.to_dict()
+    entry['id'] = transaction.id
+    entry['block_index'] = block_index
+    entry['status'] = 'pending' if block_index is None else 'confirmed'
+    return entry
+
+
+def get_block_entry(block: Block) -> dict:
+    entry = Block.get_header(block)
+    entry['transactions'] = len(block.transactions)
+    return entry
+
+
+def get_block_range(chain, cursor: str = None, limit=None):
+    """
+    Blocks from the tip to genesis. The cursor is the height where the next
+    page starts, so pages stay stable while new blocks are appended.
+    :param chain: The chain to be listed.
+    :param cursor: <str> Cursor returned with the previous page, or None
+    for the first page.
+    :param limit: <int> Page size.
+    :return: <tuple> Blocks of the page and the cursor of the next page, or
+    None on the last page.
+    """
+
+    limit = get_page_size(limit)
+    start = len(chain) - 1 if cursor is None else int(cursor)
+    if start < 0 or start >= len(chain):
+        raise ValueError('invalid cursor')
+
+    stop = max(start - limit, -1)
+    blocks = [chain[index] for index in range(start, stop, -1)]
+
+    return blocks, str(stop) if stop >= 0 else None
+
+
+def get_blocks_page(chain, cursor: str = None, limit=None) -> dict:
+    blocks, next_cursor = get_block_range(chain, cursor, limit)
+    return {
+        'blocks': [get_block_entry(block) for block in blocks],
+        'length': len(chain),
+        'next_cursor': next_cursor
+    }
+
+
+def get_transactions_page(chain, cursor: str = None, limit=None) -> dict:
+    """
+    Confirmed transactions, newest block first. The cursor is the height of
+    a block and the position of a transaction in it.
+    :return: <dict> Transactions and the cursor of the next page, or None
+    on the last page.
+    """
+
+    limit = get_page_size(limit)
+
+    if cursor is None:
+        height = len(chain) - 1
+        position = None
+    else:
+        height, position = (int(value) for value in cursor.split(':'))
+        if height < 0 or height >= len(chain) or position < 0 or \
+                position >= len(chain[height].transactions):
+            raise ValueError('invalid cursor')
+
+    transactions = []
+    while height >= 0 and len(transactions) < limit:
+        block = chain[height]
+        if position is None:
+            position = len(block.transactions) - 1
+
+        while position >= 0 and len(transactions) < limit:
+            transactions.append(get_transaction_entry(
+                block.transactions[position], block.index))
+            position -= 1
+
+        if position < 0:
+            height -= 1
+            position = None
+
+    # Blocos sem transações, como o gênesis, não iniciam uma página.
+    while position is None and height >= 0 and not chain[height].transactions:
+        height -= 1
+
+    next_cursor = None
+    if height >= 0:
+        if position is None:
+            position = len(chain[height].transactions) - 1
+        next_cursor = f'{height}:{position}'
+
+    return {'transactions': transactions, 'next_cursor': next_cursor}
+
+
+def get_pending_page(transaction_pool, cursor: str = None, limit=None) -> dict:
+    """
+    Transactions waiting in the pool, newest first. The cursor is the
+    position in this order.
+    """
+
+    limit = get_page_size(limit)
+    start = 0 if cursor is None else int(cursor)
+    if start < 0:
+        raise ValueError('invalid cursor')
+
+    pool = sorted(transaction_pool, key=lambda transaction: transaction.timestamp,
+                  reverse=True)
+    end = start + limit
+
+    return {
+        'transactions': [get_transaction_entry(transaction)
+                         for transaction in pool[start:end]],
+        'next_cursor': str(end) if end < len(pool) else None
+    }
+
+
+def find_block(chain, identifier: str) -> Block:
+    """
+    :param identifier: <str> Height or hash of the block.
+    :return: <Block> The block, or None if it is not in the chain.
+    """
+
+    if identifier.isdigit():
+        index = int(identifier)
+    else:
+        index = find_block_index(chain, identifier)
+
+    if index is None or index >= len(chain):
+        return None
+
+    return chain[index]
+
+
+def find_transaction(snapshot, transaction_id: str) -> dict:
+    """
+    :param snapshot: <Snapshot> State of the blockchain to search.
+    :return: <dict> The transaction with the given id, confirmed or in the
+    pool, or None if it is not found.
+    """
+
+    transaction = snapshot.transaction_pool.get(transaction_id)
+    if transaction is not None:
+        return get_transaction_entry(transaction)
+
+    index = snapshot.get_block_index(transaction_id)
+    if index is None:
+        return None
+
+    for transaction in snapshot.chain[index].transactions:
+        if transaction.id == transaction_id:
+            return get_transaction_entry(transaction, index)
+
+    return None
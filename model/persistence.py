@@ -0,0 +1,160 @@
+import atexit
+import time
+from collections import deque
+from threading import Condition, Lock, Thread
+
+SAVE_DELAY = 0.2  # in seconds, waiting for more changes before saving
+MAX_STALENESS = 2  # in seconds, between a change and its save
+RETRY_DELAY = 1  # in seconds, after a failed save
+STATS_WINDOW = 100  # saves kept for the latency stats
+
+BLOCKS = 'blocks'
+POOL = 'pool'
+META = 'meta'
+CHECKPOINT = 'checkpoint'
+
+
+class SaveStats:
+    def __init__(self):
+        self.saves = 0
+        self.notifications = 0
+        self.errors = 0
+        self.times = deque(maxlen=STATS_WINDOW)
+        self.staleness = deque(maxlen=STATS_WINDOW)
+
+    def record(self, elapsed: float, staleness: float):
+        self.saves += 1
+        self.times.append(elapsed)
+        self.staleness.append(staleness)
+
+    def to_dict(self) -> dict:
+        times = list(self.times)
+        staleness = list(self.staleness)
+        return {
+            'saves': self.saves,
+            'notifications': self.notifications,
+            'errors': self.errors,
+            'save_time': {
+                'last': times[-1] if times else None,
+                'avg': sum(times) / len(times) if times else None,
+                'max': max(times) if times else None
+            },
+            'max_staleness': max(staleness) if staleness else None
+        }
+
+
+class Persister:
+    """
+    Background writer of a Blockchain. Changes only mark parts of the node
+    state as dirty; the worker thread waits `delay` seconds for more changes
+    and saves every dirty part at once, so a burst of changes costs one
+    write. A part is never left unsaved for more than `max_staleness`
+    seconds, even if changes keep coming, and pending changes are saved on
+    shutdown. Parts whose save fails stay dirty and are retried after
+    RETRY_DELAY seconds.
+    """
+
+    def __init__(self, save, delay: float = SAVE_DELAY,
+                 max_staleness: float = MAX_STALENESS):
+        """
+        :param save: <callable> Called with the set of dirty parts.
+        """
+
+        self.save = save
+        self.delay = delay
+        self.max_staleness = max_staleness
+        self.stats = SaveStats()
+        self._dirty = set()
+        self._dirty_since = None  # first change not saved yet
+        self._changed_at = None  # last change not saved yet
+        self._retry_at = None  # set after a failed save
+        self._closed = False
+        self._condition = Condition()
+        self._save_lock = Lock()
+
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def mark_dirty(self, *parts):
+        with self._condition:
+            now = time.monotonic()
+            if not self._dirty:
+                self._dirty_since = now
+            self._dirty.update(parts)
+            self._changed_at = now
+            self.stats.notifications += 1
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._dirty and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+
+                # Espera mais alterações, até o limite de atraso.
+                while self._dirty and not self._closed:
+                    now = time.monotonic()
+                    deadline = min(self._changed_at + self.delay,
+                                   self._dirty_since + self.max_staleness)
+                    if self._retry_at is not None:
+                        deadline = max(deadline, self._retry_at)
+                    if now >= deadline:
+                        break
+                    self._condition.wait(deadline - now)
+
+            self.flush()
+
+    def flush(self):
+        """
+        Save the dirty parts now, on the calling thread.
+        """
+
+        with self._save_lock:
+            with self._condition:
+                parts = self._dirty
+                dirty_since = self._dirty_since
+                self._dirty = set()
+                self._dirty_since = None
+                self._changed_at = None
+
+            if not parts:
+                return
+
+            started_at = time.monotonic()
+            try:
+                self.save(parts)
+            except Exception as error:
+                self.stats.errors += 1
+                print(f'Erro ao salvar a blockchain: {error}')
+
+                # As partes voltam a ficar pendentes para a próxima tentativa.
+                with self._condition:
+                    if self._dirty:
+                        self._dirty_since = min(self._dirty_since, dirty_since)
+                    else:
+                        self._dirty_since = dirty_since
+                        self._changed_at = started_at
+                    self._dirty.update(parts)
+                    self._retry_at = time.monotonic() + RETRY_DELAY
+                return
+
+            with self._condition:
+                self._retry_at = None
+            finished_at = time.monotonic()
+            self.stats.record(finished_at - started_at,
+                              finished_at - dirty_since)
+
+    def close(self):
+        """
+        Stop the worker and save the pending changes.
+        """
+
+        atexit.unregister(self.close)
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+        self.flush()
@@ -0,0 +1,135 @@
+import time
+from hashlib import sha256
+
+DIGEST_BITS = 256
+DEFAULT_BATCH_SIZE = 5000
+
+
+def get_target(difficult: int) -> bytes:
+    """
+    Numeric target equivalent to `difficult` leading hex zeros: a digest is
+    valid if, read as a big-endian integer, it is below 16 ** (64 - difficult).
+    :param difficult: <int> Number of leading hex zeros required.
+    :return: <bytes> Target as a 32 bytes big-endian value, compared directly
+    against raw digests. None if any digest satisfies the difficult, which
+    only a difficult of 0 does.
+    """
+
+    if difficult < 0:
+        raise ValueError(f'Dificuldade inválida: {difficult}.')
+    if difficult == 0:
+        return None
+
+    bits = DIGEST_BITS - 4 * difficult
+    if bits < 0:
+        return bytes(DIGEST_BITS // 8)
+
+    return (1 << bits).to_bytes(DIGEST_BITS // 8, 'big')
+
+
+def is_valid_proof(proof: int, last_proof: int, difficult: int) -> bool:
+    """
+    Check that the hash of `proof * last_proof` has `difficult` leading hex
+    zeros, comparing the raw digest against the target.
+    :return: <bool> False for a negative difficult.
+    """
+
+    if difficult < 0:
+        return False
+
+    target = get_target(difficult)
+    if target is None:
+        return True
+
+    return sha256(b'%d' % (proof * last_proof)).digest() < target
+
+
+def search_batch(
+        last_proof: int,
+        target: bytes,
+        start: int,
+        count: int,
+        stride: int = 1) -> int:
+    """
+    Test `count` nonces, from `start` and `stride` apart, against a fixed
+    target.
+    :return: <int> First valid proof of the batch, or None.
+    """
+
+    if target is None:
+        return start
+
+    hash = sha256
+    product = start * last_proof
+    step = stride * last_proof
+
+    for i in range(count):
+        if hash(b'%d' % product).digest() < target:
+            return start + i * stride
+        product += step
+
+    return None
+
+
+class ProofSearch:
+    """
+    Single-core nonce search for one block template. The difficult target is
+    fixed when the search is created, so `get_difficult` is not consulted
+    again while nonces are tested.
+    """
+
+    def __init__(
+            self,
+            last_proof: int,
+            difficult: int,
+            start: int = None,
+            stride: int = 1,
+            batch_size: int = DEFAULT_BATCH_SIZE):
+        self.last_proof = last_proof
+        self.difficult = difficult
+        self.target = get_target(difficult)
+        self.next_proof = start if start is not None else last_proof + 1
+        self.stride = stride
+        self.batch_size = batch_size
+        self.hashes = 0
+        self.elapsed = 0.0
+
+    def step(self) -> int:
+        """
+        Test the next batch of nonces.
+        :return: <int> Proof found, or None if the batch had no valid proof.
+        """
+
+        started_at = time.perf_counter()
+        proof = search_batch(self.last_proof, self.target, self.next_proof,
+                             self.batch_size, self.stride)
+        self.elapsed += time.perf_counter() - started_at
+
+        if proof is None:
+            self.hashes += self.batch_size
+            self.next_proof += self.batch_size * self.stride
+        else:
+            self.hashes += (proof - self.next_proof) // self.stride + 1
+            self.next_proof = proof + self.stride
+
+        return proof
+
+    def run(self) -> int:
+        proof = None
+        while proof is None:
+            proof = self.step()
+        return proof
+
+    @property
+    def hash_rate(self) -> float:
+        """
+        :return: <float> Hashes per second measured so far.
+        """
+
+        if self.elapsed <= 0:
+            return 0.0
+        return self.hashes / self.elapsed
+
+
+def find_proof(last_proof: int, difficult: int) -> int:
+    return ProofSearch(last_proof, difficult).run()
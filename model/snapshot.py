@@ -0,0 +1,192 @@
+from model.block import Block
+from model.chain import ChainView
+from model.transaction import Transaction
+
+
+_DELETED = object()  # marks a key removed in a layer of a MapVersion
+
+
+class MapVersion:
+    """
+    Read-only version of a dict that keeps changing. A new version is built
+    from the previous one and only the keys changed since, sharing the
+    entries that did not change: a version is a stack of layers, newest on
+    top, and a new layer is merged into the one below it once it is at least
+    half its size. Each change is copied O(log n) times, and a lookup checks
+    O(log n) layers.
+    """
+
+    __slots__ = ('source', '_layers', '_length')
+
+    def __init__(self, source: dict, layers: tuple):
+        self.source = source
+        self._layers = layers
+        self._length = len(source)
+
+    @staticmethod
+    def of(source: dict, previous: 'MapVersion' = None,
+           changed=None) -> 'MapVersion':
+        """
+        :param source: <dict> Dict to take the version of.
+        :param previous: <MapVersion> Last version taken of `source`, or None.
+        :param changed: <set> Keys of `source` changed since `previous`.
+        :return: <MapVersion> Version with the current content of `source`.
+        """
+
+        if previous is None or previous.source is not source:
+            return MapVersion(source, (dict(source),))
+        if not changed:
+            return previous
+
+        top = {key: source.get(key, _DELETED) for key in changed}
+        layers = list(previous._layers)
+        while layers and len(layers[-1]) <= 2 * len(top):
+            # As camadas são compartilhadas com versões anteriores: a fusão
+            # cria uma camada nova.
+            merged = dict(layers.pop())
+            merged.update(top)
+            top = merged
+
+        if not layers:
+            top = {key: value for key, value in top.items()
+                   if value is not _DELETED}
+        layers.append(top)
+        return MapVersion(source, tuple(layers))
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __contains__(self, key) -> bool:
+        return self.get(key, _DELETED) is not _DELETED
+
+    def get(self, key, default=None):
+        for layer in reversed(self._layers):
+            value = layer.get(key, _DELETED)
+            if value is not _DELETED:
+                return value
+            if key in layer:
+                return default
+        return default
+
+    def items(self):
+        if len(self._layers) == 1:
+            return iter(self._layers[0].items())
+
+        merged = {}
+        for layer in self._layers:
+            for key, value in layer.items():
+                if value is _DELETED:
+                    merged.pop(key, None)
+                else:
+                    merged[key] = value
+        return iter(merged.items())
+
+    def values(self):
+        return (value for _, value in self.items())
+
+
+class PoolView:
+    """
+    Read-only version of the transaction pool, with the read methods of
+    Mempool.
+    """
+
+    __slots__ = ('_transactions',)
+
+    def __init__(self, transactions: MapVersion):
+        self._transactions = transactions
+
+    def __len__(self) -> int:
+        return len(self._transactions)
+
+    def __contains__(self, transaction_id: str) -> bool:
+        return transaction_id in self._transactions
+
+    def __iter__(self):
+        return self._transactions.values()
+
+    @property
+    def version(self) -> MapVersion:
+        return self._transactions
+
+    def get(self, transaction_id: str) -> Transaction:
+        return self._transactions.get(transaction_id)
+
+
+class Snapshot:
+    """
+    State of a Blockchain at one point in time: the chain, the transaction
+    pool, the balances, the difficult and the peers. The Blockchain publishes
+    a new snapshot after each change, and a published snapshot is never
+    modified, so readers use it without taking the writer lock and never see
+    a change half applied.
+    """
+
+    __slots__ = ('chain', 'transaction_pool', 'difficult', 'nodes',
+                 'peer_addresses', 'balances', 'pending', 'confirmed')
+
+    def __init__(self, chain, transaction_pool, difficult, nodes,
+                 peer_addresses, balances, pending, confirmed):
+        self.chain = chain
+        self.transaction_pool = transaction_pool
+        self.difficult = difficult
+        self.nodes = nodes
+        self.peer_addresses = peer_addresses
+        self.balances = balances
+        self.pending = pending
+        self.confirmed = confirmed
+
+    @staticmethod
+    def from_blockchain(blockchain, previous: 'Snapshot' = None) -> 'Snapshot':
+        """
+        Take the state of `blockchain`. Must be called holding its writer
+        lock. The pool, the balances and the confirmed transactions are
+        versions of the ones in `previous` with only the entries changed
+        since, so publishing costs the size of the change.
+        """
+
+        ledger = blockchain.ledger
+        pool = blockchain.transaction_pool
+        balances, pending, confirmed = ledger.take_changes()
+        pool_changes = pool.take_changes()
+
+        if previous is None:
+            previous_pool = previous_balances = previous_pending = \
+                previous_confirmed = None
+        else:
+            previous_pool = previous.transaction_pool.version
+            previous_balances = previous.balances
+            previous_pending = previous.pending
+            previous_confirmed = previous.confirmed
+
+        return Snapshot(
+            chain=ChainView(blockchain.chain),
+            transaction_pool=PoolView(MapVersion.of(
+                pool.transactions, previous_pool, pool_changes)),
+            difficult=blockchain.difficult,
+            nodes=frozenset(blockchain.nodes),
+            peer_addresses=frozenset(blockchain.peer_addresses),
+            balances=MapVersion.of(ledger.balances, previous_balances,
+                                   balances),
+            pending=MapVersion.of(ledger.pending, previous_pending, pending),
+            confirmed=MapVersion.of(ledger.confirmed, previous_confirmed,
+                                    confirmed)
+        )
+
+    @property
+    def last_block(self) -> Block:
+        return self.chain[-1]
+
+    def get_balance(self, address: str) -> int:
+        return self.balances.get(address, 0) + self.pending.get(address, 0)
+
+    def get_block_index(self, transaction_id: str) -> int:
+        """
+        :return: <int> Index of the block in this snapshot's chain that
+        confirms the transaction, or None.
+        """
+
+        index = self.confirmed.get(transaction_id)
+        if index is None or index >= len(self.chain):
+            return None
+        return index
@@ -0,0 +1,485 @@
+import json
+import mmap
+import os
+import pickle
+import struct
+import zlib
+from hashlib import sha256
+from threading import Lock, RLock
+
+from model.block import Block
+from model.transaction import Transaction
+from utils import CustomJSONEncoder
+
+SEGMENT_SIZE = 16 * 1024 * 1024  # in bytes
+
+# Each record holds one block: payload length, crc32, block index and raw
+# block hash, followed by the block encoded as JSON.
+RECORD_HEADER = struct.Struct('>IIQ32s')
+
+# The index file starts with a header holding the last indexed position of
+# the log and the number of entries, followed by one entry per block.
+INDEX_HEADER = struct.Struct('>8sIQQ')
+INDEX_ENTRY = struct.Struct('>IQI32s')
+INDEX_MAGIC = b'UFCIDX01'
+INDEX_GROWTH = 4096  # entries added to the index file when it is full
+
+# A checkpoint file holds the hex sha256 of the ledger state on its first
+# line, followed by the state encoded as JSON. Only the newest
+# CHECKPOINTS_KEPT are kept.
+CHECKPOINTS_KEPT = 2
+
+BLOCKS_DIR = 'blocks'
+CHECKPOINTS_DIR = 'checkpoints'
+INDEX_FILE = 'index'
+POOL_FILE = 'pool'
+META_FILE = 'meta'
+LEGACY_FILE = 'chain'
+
+
+def hash_to_bytes(hash: str) -> bytes:
+    try:
+        raw = bytes.fromhex(hash)
+    except (TypeError, ValueError):
+        raw = b''
+    return raw.ljust(32, b'\0')[:32]
+
+
+def write_atomic(file: str, content: bytes):
+    """
+    Replace `file` with `content` so that readers and crashes only ever see
+    the old or the new version.
+    """
+
+    tmp_file = f'{file}.tmp'
+    with open(tmp_file, 'wb') as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, file)
+
+
+class BlockIndex:
+    """
+    Fixed-width index of the block log, memory-mapped from disk. Entry `h`
+    holds the segment, offset, length and raw hash of the block with index
+    `h`. The header records how far the log had been indexed, so a restart
+    only has to scan records written after it.
+    """
+
+    def __init__(self, file: str):
+        self.file = file
+        self.count = 0
+        self.segment = 0
+        self.segment_end = 0
+        self._by_hash = None
+
+        if not os.path.exists(file):
+            with open(file, 'wb') as f:
+                f.write(INDEX_HEADER.pack(INDEX_MAGIC, 0, 0, 0))
+
+        self._file = open(file, 'r+b')
+        self._map = None
+        self._remap(INDEX_HEADER.size + INDEX_GROWTH * INDEX_ENTRY.size)
+
+    def _remap(self, size: int):
+        if self._map is not None:
+            self._map.close()
+
+        current_size = os.fstat(self._file.fileno()).st_size
+        if current_size < size:
+            self._file.truncate(size)
+            current_size = size
+
+        self._map = mmap.mmap(self._file.fileno(), current_size)
+
+    def load(self) -> bool:
+        magic, segment, segment_end, count = INDEX_HEADER.unpack_from(
+            self._map, 0)
+        capacity = (len(self._map) - INDEX_HEADER.size) // INDEX_ENTRY.size
+
+        if magic != INDEX_MAGIC or count > capacity:
+            self.reset()
+            return False
+
+        self.segment = segment
+        self.segment_end = segment_end
+        self.count = count
+        return True
+
+    def reset(self):
+        self.count = 0
+        self.segment = 0
+        self.segment_end = 0
+        self._by_hash = None
+        self.write_header()
+
+    def write_header(self):
+        INDEX_HEADER.pack_into(self._map, 0, INDEX_MAGIC, self.segment,
+                               self.segment_end, self.count)
+
+    def get(self, index: int):
+        """
+        :return: <tuple> (segment, offset, length, raw hash) of a block.
+        """
+
+        if index < 0 or index >= self.count:
+            raise IndexError(index)
+
+        return INDEX_ENTRY.unpack_from(
+            self._map, INDEX_HEADER.size + index * INDEX_ENTRY.size)
+
+    def get_hash(self, index: int) -> bytes:
+        return self.get(index)[3]
+
+    def set(self, index: int, segment: int, offset: int, length: int,
+            raw_hash: bytes):
+        """
+        Set the entry of block `index`, dropping every entry after it.
+        """
+
+        if index > self.count:
+            raise IndexError(index)
+
+        if self._by_hash is not None:
+            for dropped in range(index, self.count):
+                self._by_hash.pop(self.get_hash(dropped), None)
+
+        position = INDEX_HEADER.size + index * INDEX_ENTRY.size
+        if position + INDEX_ENTRY.size > len(self._map):
+            self._remap(len(self._map) + INDEX_GROWTH * INDEX_ENTRY.size)
+
+        INDEX_ENTRY.pack_into(self._map, position, segment, offset, length,
+                              raw_hash)
+        self.count = index + 1
+
+        if self._by_hash is not None:
+            self._by_hash[raw_hash] = index
+
+    def find(self, raw_hash: bytes) -> int:
+        """
+        Look up a block index by hash. The hash table is only built on the
+        first lookup.
+        :return: <int> Index of the block, or None.
+        """
+
+        if self._by_hash is None:
+            self._by_hash = {self.get_hash(index): index
+                             for index in range(self.count)}
+
+        return self._by_hash.get(raw_hash)
+
+    def flush(self):
+        self._map.flush()
+
+
+class BlockStore:
+    """
+    Storage engine of a node. Blocks are appended as records to a log split
+    into segments; the transaction pool and the node metadata are kept in
+    separate small files replaced atomically.
+
+    A record for index `h` supersedes every record previously written for
+    index `h` or above, so switching forks only appends the new suffix.
+
+    Segments are read through memory maps, so blocks are decoded only when
+    they are accessed.
+    """
+
+    def __init__(self, path: str, segment_size: int = SEGMENT_SIZE):
+        self.path = path
+        self.blocks_path = os.path.join(path, BLOCKS_DIR)
+        self.segment_size = segment_size
+        self._lock = RLock()
+        self._maps = {}
+
+        os.makedirs(self.blocks_path, exist_ok=True)
+        self._index = BlockIndex(os.path.join(self.blocks_path, INDEX_FILE))
+        self._recover()
+
+    @property
+    def height(self) -> int:
+        return self._index.count
+
+    def _segment_file(self, segment: int) -> str:
+        return os.path.join(self.blocks_path, f'{segment:08d}.log')
+
+    def _segments(self):
+        segments = [int(name[:-4]) for name in os.listdir(self.blocks_path)
+                    if name.endswith('.log') and name[:-4].isdigit()]
+        return sorted(segments)
+
+    def _recover(self):
+        """
+        Bring the index up to date with the log. Records written after the
+        position saved in the index are scanned; if the index does not match
+        the log, the whole log is scanned again. A torn or corrupted record
+        ends the log: it is truncated there and later segments are removed.
+        """
+
+        segments = self._segments()
+        index = self._index
+
+        if index.load():
+            file = self._segment_file(index.segment)
+            if index.count > 0 and (not os.path.exists(file) or
+                                    os.path.getsize(file) < index.segment_end):
+                index.reset()
+
+        pending = [segment for segment in segments
+                   if segment >= index.segment]
+
+        for position, segment in enumerate(pending):
+            file = self._segment_file(segment)
+            start = index.segment_end if segment == index.segment else 0
+            size = os.path.getsize(file)
+
+            offset = start
+            if size > start:
+                with open(file, 'rb') as f:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                        offset = self._scan_segment(segment, data, start)
+
+            index.segment = segment
+            index.segment_end = offset
+
+            if offset < size:
+                with open(file, 'r+b') as f:
+                    f.truncate(offset)
+                for later_segment in pending[position + 1:]:
+                    os.remove(self._segment_file(later_segment))
+                break
+
+        index.write_header()
+        index.flush()
+
+    def _scan_segment(self, segment: int, data, offset: int) -> int:
+        while offset + RECORD_HEADER.size <= len(data):
+            length, crc, block_index, raw_hash = RECORD_HEADER.unpack_from(
+                data, offset)
+            start = offset + RECORD_HEADER.size
+            end = start + length
+
+            if end > len(data) or block_index > self._index.count:
+                break
+
+            checksum = zlib.crc32(data[offset + 8:end])
+            if checksum != crc:
+                break
+
+            self._index.set(block_index, segment, start, length, raw_hash)
+            offset = end
+
+        return offset
+
+    def _encode_record(self, block: Block) -> bytes:
+        payload = json.dumps(block, cls=CustomJSONEncoder).encode()
+        body = struct.pack('>Q32s', block.index, hash_to_bytes(block.hash))
+        body += payload
+        header = struct.pack('>II', len(payload), zlib.crc32(body))
+        return header + body
+
+    def write_blocks(self, blocks):
+        """
+        Append blocks to the log. Each block replaces any stored block with
+        the same or a greater index.
+        """
+
+        blocks = list(blocks)
+        if not blocks:
+            return
+
+        with self._lock:
+            index = self._index
+            if blocks[0].index > index.count:
+                raise ValueError('Blocos fora de ordem.')
+
+            if index.segment_end >= self.segment_size:
+                index.segment += 1
+                index.segment_end = 0
+
+            entries = []
+            file = self._segment_file(index.segment)
+            with open(file, 'ab') as f:
+                end = index.segment_end
+                for block in blocks:
+                    record = self._encode_record(block)
+                    f.write(record)
+                    entries.append((block.index, end + RECORD_HEADER.size,
+                                    len(record) - RECORD_HEADER.size,
+                                    hash_to_bytes(block.hash)))
+                    end += len(record)
+
+                f.flush()
+                os.fsync(f.fileno())
+
+            # O índice só é atualizado depois que os registros estão no disco.
+            for block_index, offset, length, raw_hash in entries:
+                index.set(block_index, index.segment, offset, length, raw_hash)
+            index.segment_end = end
+            index.write_header()
+            index.flush()
+
+    def sync_chain(self, chain):
+        """
+        Write the blocks of `chain` that are not stored yet, starting at the
+        last block both have in common.
+        """
+
+        height = min(self.height, len(chain))
+        while height > 0 and \
+                self.get_hash(height - 1) != chain[height - 1].hash:
+            height -= 1
+
+        if height < len(chain):
+            self.write_blocks(chain[height:])
+        elif height < self.height:
+            # A record can only truncate the log by being written, so the
+            # last common block is written again.
+            self.write_blocks(chain[height - 1:height])
+
+    def get_hash(self, index: int) -> str:
+        return self._index.get_hash(index).hex()
+
+    def find(self, hash: str) -> int:
+        """
+        :return: <int> Index of the stored block with the given hash, or None.
+        """
+
+        with self._lock:
+            return self._index.find(hash_to_bytes(hash))
+
+    def _segment_map(self, segment: int, end: int):
+        data = self._maps.get(segment)
+        if data is None or len(data) < end:
+            if data is not None:
+                data.close()
+            with open(self._segment_file(segment), 'rb') as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[segment] = data
+        return data
+
+    def read_payload(self, index: int) -> bytes:
+        with self._lock:
+            segment, offset, length, _ = self._index.get(index)
+            data = self._segment_map(segment, offset + length)
+            return data[offset:offset + length]
+
+    def read_block(self, index: int) -> Block:
+        return Block.from_dict(json.loads(self.read_payload(index)))
+
+    def save_pool(self, transactions):
+        content = json.dumps(list(transactions), cls=CustomJSONEncoder)
+        write_atomic(os.path.join(self.path, POOL_FILE), content.encode())
+
+    def load_pool(self):
+        try:
+            with open(os.path.join(self.path, POOL_FILE), 'rb') as f:
+                return [Transaction.from_dict(tr) for tr in json.load(f)]
+        except (OSError, ValueError):
+            return []
+
+    def save_meta(self, meta: dict):
+        content = json.dumps(meta, cls=CustomJSONEncoder)
+        write_atomic(os.path.join(self.path, META_FILE), content.encode())
+
+    def load_meta(self) -> dict:
+        try:
+            with open(os.path.join(self.path, META_FILE), 'rb') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _checkpoint_files(self):
+        """
+        :return: <list> Checkpoint files, newest first.
+        """
+
+        path = os.path.join(self.path, CHECKPOINTS_DIR)
+        if not os.path.isdir(path):
+            return []
+
+        names = sorted((name for name in os.listdir(path)
+                        if name.endswith('.checkpoint')), reverse=True)
+        return [os.path.join(path, name) for name in names]
+
+    def save_checkpoint(self, state: dict):
+        """
+        Write a ledger checkpoint and drop the oldest ones.
+        :param state: <dict> Ledger state, with the `height` it was taken at.
+        """
+
+        path = os.path.join(self.path, CHECKPOINTS_DIR)
+        os.makedirs(path, exist_ok=True)
+
+        content = json.dumps(state, cls=CustomJSONEncoder).encode()
+        checksum = sha256(content).hexdigest().encode()
+        file = os.path.join(path, f'{state["height"]:012d}.checkpoint')
+        write_atomic(file, checksum + b'\n' + content)
+
+        for file in self._checkpoint_files()[CHECKPOINTS_KEPT:]:
+            os.remove(file)
+
+    def load_checkpoints(self):
+        """
+        Read the checkpoints whose checksum matches, newest first. Damaged
+        ones are skipped.
+        """
+
+        for file in self._checkpoint_files():
+            try:
+                with open(file, 'rb') as f:
+                    checksum, content = f.read().split(b'\n', 1)
+                if sha256(content).hexdigest().encode() != checksum:
+                    continue
+                state = json.loads(content)
+            except (OSError, ValueError):
+                continue
+
+            yield state
+
+    def migrate_legacy(self) -> bool:
+        """
+        Import the pickled Blockchain written by older versions, once. The
+        pickle file is kept, renamed, after the import.
+        :return: <bool> True if a legacy file was imported.
+        """
+
+        file = os.path.join(self.path, LEGACY_FILE)
+        if self.height > 0 or not os.path.exists(file):
+            return False
+
+        try:
+            with open(file, 'rb') as blockchain_file:
+                blockchain = pickle.load(blockchain_file)
+        except Exception:
+            return False
+
+        work = 0
+        for block in blockchain.chain:
+            work += Block.get_work(block)
+            block.cumulative_work = work
+
+        self.write_blocks(blockchain.chain)
+        self.save_pool(blockchain.transaction_pool)
+        self.save_meta({
+            'block_generation_inverval': blockchain.block_generation_inverval,
+            'difficult_adjustment_interval':
+                blockchain.difficult_adjustment_interval,
+            'difficult': blockchain.difficult,
+            'nodes': blockchain.nodes,
+            'peer_addresses': blockchain.peer_addresses
+        })
+        os.replace(file, f'{file}.migrated')
+        return True
+
+
+_stores = {}
+_stores_lock = Lock()
+
+
+def get_store(path: str) -> BlockStore:
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = BlockStore(path)
+        return _stores[path]
@@ -1,11 +1,68 @@
+import sys
 import time
+from hashlib import sha256
+
+
+def intern_address(address):
+    # Endereços se repetem em muitas transações; internados, todas
+    # compartilham a mesma string.
+    return sys.intern(address) if type(address) is str else address
+
 
 class Transaction:
+    __slots__ = ('sender', 'receiver', 'amount', 'timestamp', '_id')
+
     def __init__(self, sender, receiver, amount, timestamp=None) -> None:
-        self.sender = sender
-        self.receiver = receiver
+        self.sender = intern_address(sender)
+        self.receiver = intern_address(receiver)
         self.amount = amount
         self.timestamp = timestamp if timestamp is not None else time.time()
+        self._id = None
+
+    @staticmethod
+    def hash_transaction(transaction: 'Transaction') -> str:
+        """
+        Hash a transaction.
+        :param transaction: <Transaction> The transaction to be hashed.
+        :return: <str> The hash of the transaction.
+        """
+
+        encoded_transaction = f'{transaction.sender}{transaction.receiver}'\
+            f'{transaction.amount}{transaction.timestamp}'.encode()
+
+        return sha256(encoded_transaction).hexdigest()
+
+    @property
+    def id(self) -> str:
+        if getattr(self, '_id', None) is None:
+            self._id = Transaction.hash_transaction(self)
+        return self._id
+
+    def to_dict(self) -> dict:
+        return {
+            'sender': self.sender,
+            'receiver': self.receiver,
+            'amount': self.amount,
+            'timestamp': self.timestamp
+        }
+
+    def __getstate__(self) -> dict:
+        return self.to_dict()
+
+    def __setstate__(self, state):
+        """
+        Restore a pickled transaction, including the ones pickled before the
+        class had slots, whose state is their attribute dict.
+        """
+
+        if isinstance(state, tuple):
+            state = {**(state[0] or {}), **(state[1] or {})}
+
+        self.sender = intern_address(state['sender'])
+        self.receiver = intern_address(state['receiver'])
+        self.amount = state['amount']
+        self.timestamp = state['timestamp']
+        self._id = None
 
     @staticmethod
     def from_dict(trdict):
@@ -20,10 +77,11 @@ class Transaction:
 
 
 COINBASE_AMOUNT = 5
+COINBASE_SENDER = '0'
 
 
 def get_coinbase_transaction(receiver):
-    return Transaction('0', receiver, COINBASE_AMOUNT)
+    return Transaction(COINBASE_SENDER, receiver, COINBASE_AMOUNT)
 
 
 def create_transaction(sender_addr, receiver_addr, amount):
@@ -44,20 +44,20 @@ def find_last_transaction_by_user(address, transactions):
     return last_transaction
 
 
-def create_transaction(receiver_addr, my_addr, amount, transactions):
-    last_transaction = find_last_transaction_by_user(my_addr, transactions)
+def create_transaction(receiver_addr, my_addr, amount, ledger):
+    last_sent = ledger.get_last_sent(my_addr)
 
     current_time = time.time()
 
-    if last_transaction is not None:
-        diff = current_time - last_transaction.timestamp
+    if last_sent is not None:
+        diff = current_time - last_sent
         if diff < 600:  # 600 segundos ou 10 minutos
             time_left = time.strftime("%M:%S", time.gmtime(600 - diff))
             message = f'Usuários só podem realizar uma transação a cada 10 minutos. ' \
                 f'Próxima transação pode ser realizada em {time_left}'
             raise RuntimeError(message)
 
-    balance = get_balance(my_addr, transactions)
+    balance = ledger.get_balance(my_addr)
 
     if balance < amount:
         raise RuntimeError("Saldo menor que a quantidade enviada.")
@@ -0,0 +1,347 @@
+import json
+import struct
+import zlib
+
+from model import Block
+from model.transaction import Transaction
+from utils import CustomJSONEncoder
+
+JSON = 'json'
+BINARY = 'binary/2'
+ENCODINGS = [BINARY, JSON]
+
+MAGIC = b'UF'
+VERSION = 2
+FRAME_HEADER = struct.Struct('>2sBH')  # magic, version, message type
+
+# Frames compressed with zlib, used by the bulk chain transfer. They wrap a
+# message in either encoding.
+COMPRESSED_MAGIC = b'UZ'
+COMPRESSION_LEVEL = 6
+MAX_DECOMPRESSED_SIZE = 16 * 1024 * 1024  # in bytes
+
+# Tags of the encoded values. Hashes and addresses, hex strings of 32 or 64
+# bytes, are sent as raw bytes.
+NONE = b'N'
+TRUE = b'T'
+FALSE = b'F'
+INT = b'i'
+BIG_INT = b'I'
+FLOAT = b'd'
+STRING = b's'
+HASH = b'h'
+ADDRESS = b'a'
+LIST = b'l'
+DICT = b'm'
+BLOCK = b'B'
+TRANSACTION = b'X'
+
+INT64 = struct.Struct('>q')
+UINT32 = struct.Struct('>I')
+FLOAT64 = struct.Struct('>d')
+BLOCK_HEADER = struct.Struct('>QdQH')  # index, timestamp, proof, difficult
+TRANSACTION_FIELDS = struct.Struct('>qd')  # amount, timestamp
+
+
+class DecodeError(ValueError):
+    pass
+
+
+def _encode_hex(value: str, out: bytearray) -> bool:
+    if len(value) not in (64, 128):
+        return False
+
+    try:
+        raw = bytes.fromhex(value)
+    except ValueError:
+        return False
+
+    if raw.hex() != value:
+        return False
+
+    out += HASH if len(raw) == 32 else ADDRESS
+    out += raw
+    return True
+
+
+def _fits(value, bits: int, signed: bool = False) -> bool:
+    if not isinstance(value, int) or isinstance(value, bool):
+        return False
+    if signed:
+        return -2 ** (bits - 1) <= value < 2 ** (bits - 1)
+    return 0 <= value < 2 ** bits
+
+
+def _is_float(value) -> bool:
+    # Só um float volta igual do campo float64: um int voltaria como float e
+    # mudaria o hash do bloco ou o id da transação.
+    return type(value) is float
+
+
+def _encode_transaction(transaction: Transaction, out: bytearray):
+    # Valores fora dos campos de tamanho fixo, recebidos de outro peer, são
+    # enviados como dicionário.
+    if not (_fits(transaction.amount, 64, signed=True) and
+            _is_float(transaction.timestamp)):
+        _encode_value(transaction.to_dict(), out)
+        return
+
+    out += TRANSACTION
+    _encode_value(transaction.sender, out)
+    _encode_value(transaction.receiver, out)
+    out += TRANSACTION_FIELDS.pack(transaction.amount, transaction.timestamp)
+
+
+def _encode_block(block: Block, out: bytearray):
+    if not (_fits(block.index, 64) and _fits(block.proof, 64) and
+            _fits(block.difficult, 16) and _is_float(block.timestamp)):
+        _encode_value(block.to_dict(), out)
+        return
+
+    out += BLOCK
+    out += BLOCK_HEADER.pack(block.index, block.timestamp, block.proof,
+                             block.difficult)
+    _encode_value(block.previous_hash, out)
+    _encode_value(block.hash, out)
+    _encode_value(getattr(block, 'merkle_root', None), out)
+    _encode_value(block.cumulative_work, out)
+    out += UINT32.pack(len(block.transactions))
+    for transaction in block.transactions:
+        _encode_transaction(transaction, out)
+
+
+def _encode_value(value, out: bytearray):
+    if value is None:
+        out += NONE
+    elif value is True:
+        out += TRUE
+    elif value is False:
+        out += FALSE
+    elif isinstance(value, int):
+        if _fits(value, 64, signed=True):
+            out += INT
+            out += INT64.pack(value)
+        else:
+            raw = str(value).encode()
+            out += BIG_INT
+            out += UINT32.pack(len(raw))
+            out += raw
+    elif isinstance(value, float):
+        out += FLOAT
+        out += FLOAT64.pack(value)
+    elif isinstance(value, str):
+        if not _encode_hex(value, out):
+            raw = value.encode()
+            out += STRING
+            out += UINT32.pack(len(raw))
+            out += raw
+    elif isinstance(value, Block):
+        _encode_block(value, out)
+    elif isinstance(value, Transaction):
+        _encode_transaction(value, out)
+    elif isinstance(value, dict):
+        out += DICT
+        out += UINT32.pack(len(value))
+        for key, item in value.items():
+            _encode_value(str(key), out)
+            _encode_value(item, out)
+    elif isinstance(value, (list, tuple, set, frozenset)) or \
+            hasattr(value, '__iter__'):
+        items = list(value)
+        out += LIST
+        out += UINT32.pack(len(items))
+        for item in items:
+            _encode_value(item, out)
+    elif hasattr(value, 'to_dict'):
+        _encode_value(value.to_dict(), out)
+    else:
+        _encode_value(value.__dict__, out)
+
+
+class _Reader:
+    def __init__(self, data: bytes, offset: int = 0):
+        self.data = data
+        self.offset = offset
+
+    def take(self, size: int) -> bytes:
+        end = self.offset + size
+        if end > len(self.data):
+            raise DecodeError('Mensagem incompleta.')
+        chunk = self.data[self.offset:end]
+        self.offset = end
+        return chunk
+
+    def unpack(self, fmt: struct.Struct):
+        values = fmt.unpack_from(self.data, self.offset)
+        self.offset += fmt.size
+        return values
+
+    def value(self):
+        tag = self.take(1)
+
+        if tag == NONE:
+            return None
+        if tag == TRUE:
+            return True
+        if tag == FALSE:
+            return False
+        if tag == INT:
+            return self.unpack(INT64)[0]
+        if tag == BIG_INT:
+            return int(self.take(self.unpack(UINT32)[0]))
+        if tag == FLOAT:
+            return self.unpack(FLOAT64)[0]
+        if tag == STRING:
+            return self.take(self.unpack(UINT32)[0]).decode()
+        if tag == HASH:
+            return self.take(32).hex()
+        if tag == ADDRESS:
+            return self.take(64).hex()
+        if tag == LIST:
+            return [self.value() for _ in range(self.unpack(UINT32)[0])]
+        if tag == DICT:
+            count = self.unpack(UINT32)[0]
+            return {self.value(): self.value() for _ in range(count)}
+        if tag == BLOCK:
+            return self.block()
+        if tag == TRANSACTION:
+            return self.transaction()
+
+        raise DecodeError(f'Tipo desconhecido: {tag!r}.')
+
+    def transaction(self) -> dict:
+        sender = self.value()
+        receiver = self.value()
+        amount, timestamp = self.unpack(TRANSACTION_FIELDS)
+        return {
+            'sender': sender,
+            'receiver': receiver,
+            'amount': amount,
+            'timestamp': timestamp
+        }
+
+    def block(self) -> dict:
+        index, timestamp, proof, difficult = self.unpack(BLOCK_HEADER)
+        previous_hash = self.value()
+        hash = self.value()
+        merkle_root = self.value()
+        cumulative_work = self.value()
+        count = self.unpack(UINT32)[0]
+        transactions = [self.value() for _ in range(count)]
+
+        return {
+            'index': index,
+            'timestamp': timestamp,
+            'transactions': transactions,
+            'proof': proof,
+            'difficult': difficult,
+            'previous_hash': previous_hash,
+            'hash': hash,
+            'merkle_root': merkle_root,
+            'cumulative_work': cumulative_work
+        }
+
+
+def get_type(message) -> int:
+    if isinstance(message, dict):
+        return message['type']
+    return message.type
+
+
+def get_data(message):
+    if isinstance(message, dict):
+        return message['data']
+    return message.data
+
+
+def encode(message, encoding: str = JSON):
+    """
+    Encode a message. JSON messages are text, as sent by every version of
+    the node; binary messages are bytes and are only sent to peers that
+    announced support for them.
+    """
+
+    if encoding == BINARY:
+        out = bytearray(FRAME_HEADER.pack(MAGIC, VERSION, get_type(message)))
+        _encode_value(get_data(message), out)
+        return bytes(out)
+
+    return json.dumps(message, cls=CustomJSONEncoder)
+
+
+def compress(message, encoding: str = JSON) -> bytes:
+    data = encode(message, encoding)
+    if isinstance(data, str):
+        data = data.encode()
+    return COMPRESSED_MAGIC + zlib.compress(data, COMPRESSION_LEVEL)
+
+
+def decompress(data: bytes):
+    """
+    :return: The message wrapped by a compressed frame, as bytes if binary
+    or str if JSON, or None if the frame is invalid or too large.
+    """
+
+    decompressor = zlib.decompressobj()
+    try:
+        inner = decompressor.decompress(
+            data[len(COMPRESSED_MAGIC):], MAX_DECOMPRESSED_SIZE)
+    except zlib.error:
+        return None
+
+    if decompressor.unconsumed_tail or not decompressor.eof:
+        return None
+
+    if inner.startswith(MAGIC):
+        return inner
+
+    try:
+        return inner.decode()
+    except UnicodeDecodeError:
+        return None
+
+
+def decode(data) -> dict:
+    """
+    Decode a message in either encoding, compressed or not, into the same
+    dict JSON messages are parsed into. Blocks and transactions are returned
+    as dicts.
+    :return: <dict> The message, or None if it is invalid.
+    """
+
+    if isinstance(data, (bytes, bytearray, memoryview)) and \
+            bytes(data[:len(COMPRESSED_MAGIC)]) == COMPRESSED_MAGIC:
+        data = decompress(bytes(data))
+        if data is None:
+            return None
+
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        try:
+            magic, version, type = FRAME_HEADER.unpack_from(data, 0)
+            if magic != MAGIC or version != VERSION:
+                return None
+            reader = _Reader(bytes(data), FRAME_HEADER.size)
+            return {'type': type, 'data': reader.value()}
+        except (DecodeError, struct.error, UnicodeDecodeError):
+            return None
+
+    try:
+        return json.loads(data)
+    except ValueError:
+        return None
+
+
+def get_encoding(data) -> str:
+    return BINARY if isinstance(data, (bytes, bytearray, memoryview)) else JSON
+
+
+def choose_encoding(encodings) -> str:
+    """
+    :return: <str> The preferred encoding a peer announced, JSON if it
+    announced none.
+    """
+
+    for encoding in ENCODINGS:
+        if encodings and encoding in encodings:
+            return encoding
+    return JSON
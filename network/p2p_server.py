@@ -1,13 +1,20 @@
 import asyncio
-from copy import deepcopy
 import json
+import time
+from collections import deque
+from concurrent.futures import Future
+from threading import Lock
 from typing import Any
 
 import websockets
+from network import codec
+from network.peers import ConnectionPool
 from model import Block
+from model.chain import find_ancestor, find_block_index, get_locator
+from model.merkle import verify_merkle_proof
+from model.orphans import OrphanPool
 from model.transaction import Transaction
 from model.wallet import get_identifier
-from utils import CustomJSONEncoder
 
 
 class MessageType:
@@ -19,6 +26,27 @@ class MessageType:
     RESPONSE_TRANSACTION = 5
     CONNECT_MESSAGE = 6
     DIFFICULT = 5
+    QUERY_BLOCKS = 9
+    RESPONSE_BLOCKS = 10
+    BLOCKS_STREAM = 11
+    QUERY_PROOF = 12
+    RESPONSE_PROOF = 13
+    INVENTORY = 14
+    QUERY_TRANSACTIONS = 15
+
+
+MAX_BLOCKS_PER_MESSAGE = 100
+# Limites de cada frame da transferência em massa, antes da compressão.
+MAX_BLOCKS_PER_FRAME = 500
+MAX_TRANSACTIONS_PER_FRAME = 5000
+MAX_FORK_BLOCKS = 5000  # blocks of a fork kept while it has less work
+RELAY_INTERVAL = 0.5  # in seconds, new transactions announced together
+MAX_INVENTORY = 1000  # transaction ids per announcement
+REQUEST_TIMEOUT = 10  # in seconds, before a transaction is requested again
+PROOF_TIMEOUT = 5  # in seconds, waiting for the peers to send a proof
+MAX_PENDING_TASKS = 1000  # coroutines kept while the loop is not running
+INVENTORY_FEATURE = 'inventory'
+BLOCKS_FEATURE = 'blocks'  # answers QUERY_BLOCKS
 
 
 class Message:
@@ -29,6 +57,17 @@ class Message:
 
 sockets = set()
 address = None
+loop = None  # event loop of the P2P server, where all network work runs
+loop_lock = Lock()
+pending_tasks = deque()  # coroutines submitted before the loop started
+syncs = {}  # blocks of a fork being downloaded, by websocket
+streams = {}  # state of the block streams being received, by websocket
+peer_uris = {}  # server address of the peer of each incoming connection
+relay = {}  # transactions waiting to be announced, by id
+relay_timer = None
+requested = {}  # time transactions were requested, by id
+proof_requests = {}  # futures waiting for an inclusion proof, by transaction id
+orphans = OrphanPool()  # blocks received before their parent
 
 
 def get_sockets():
@@ -42,28 +81,29 @@ def get_addr(websocket):
 
 
 async def init_connection(uri):
+    await run_on_loop(_init_connection(uri))
+
+
+async def _init_connection(uri):
     global address
 
     if uri == address:
-        blockchain.nodes.remove(uri)
+        blockchain.remove_node(uri)
         update_blockchain_nodes()
 
     if not uri in sockets and uri != address:
         sockets.add(uri)
-        try:
-            async with websockets.connect(uri) as websocket:
-                await write(websocket, connect_message())
-                await write(websocket, query_chain_length())
-        except:
+        connection = connections.get(uri)
+        if not (await connection.send(encode(connect_message())) and
+                await connection.send(encode(query_chain_length()))):
             sockets.remove(uri)
+            await connections.remove(uri)
 
         update_blockchain_nodes()
-        
 
 
 def update_blockchain_nodes():
-    blockchain.nodes = sockets
-    blockchain.save_blockchain(blockchain, get_identifier())
+    blockchain.set_nodes(sockets)
 
 
 def json_to_object(data):
@@ -90,47 +130,130 @@ def blockchain_from_json(obj):
 
 
 async def handler(websocket):
-    async for data in websocket:
-        message = json_to_object(data)
+    try:
+        async for data in websocket:
+            if not await handle_message(websocket, data):
+                return
+    except websockets.ConnectionClosed:
+        # Conexões dos peers são mantidas abertas e podem cair a qualquer
+        # momento.
+        return
+    finally:
+        syncs.pop(websocket, None)
+        streams.pop(websocket, None)
+        peer_uris.pop(websocket, None)
+
+
+async def handle_message(websocket, data) -> bool:
+    message = codec.decode(data)
+
+    if message is None:
+        return False
+
+    # As respostas usam o mesmo formato da mensagem recebida.
+    encoding = codec.get_encoding(data)
+
+    if message['type'] == MessageType.CONNECT_MESSAGE:
+        await handle_connection(message['data'], websocket)
+    elif message['type'] == MessageType.QUERY_LATEST_BLOCK:
+        broadcast_latest()
+    elif message['type'] == MessageType.QUERY_BLOCKCHAIN:
+        broadcast_all()
+    elif message['type'] == MessageType.RESPONSE_LATEST_BLOCK:
+        handle_latest_block(message['data'], websocket, encoding)
+    elif message['type'] == MessageType.RESPONSE_BLOCKCHAIN:
+        handle_blockchain_response(message['data'])
+    elif message['type'] == MessageType.RESPONSE_TRANSACTION:
+        handle_transaction(message['data'])
+    elif message['type'] == MessageType.RESPONSE_TRANSACTIONS:
+        handle_transactions(message['data'])
+    elif message['type'] == MessageType.INVENTORY:
+        request = request_transactions(message['data'])
+        if request is not None:
+            await write(websocket, request, encoding)
+    elif message['type'] == MessageType.QUERY_TRANSACTIONS:
+        await write(websocket, response_transactions(message['data']), encoding)
+    elif message['type'] == MessageType.DIFFICULT:
+        handle_difficult_change(message['data'])
+    elif message['type'] == MessageType.QUERY_BLOCKS:
+        if message['data'].get('stream'):
+            asyncio.ensure_future(
+                stream_blocks(websocket, message['data'], encoding))
+        else:
+            await write(websocket, response_blocks(message['data']), encoding)
+    elif message['type'] == MessageType.RESPONSE_BLOCKS:
+        await handle_blocks_response(websocket, message['data'], encoding)
+    elif message['type'] == MessageType.BLOCKS_STREAM:
+        handle_blocks_stream(websocket, message['data'])
+    elif message['type'] == MessageType.QUERY_PROOF:
+        await write(websocket, response_proof(message['data']), encoding)
+    elif message['type'] == MessageType.RESPONSE_PROOF:
+        handle_proof_response(message['data'])
+
+    return True
+
+
+def encode(message, encoding: str = codec.JSON):
+    return codec.encode(message, encoding)
+
+
+async def write(websocket, message, encoding: str = codec.JSON):
+    await websocket.send(encode(message, encoding))
 
-        if message is None:
-            return
 
-        if message['type'] == MessageType.CONNECT_MESSAGE:
-            await handle_connection(message['data'])
-        elif message['type'] == MessageType.QUERY_LATEST_BLOCK:
-            broadcast_latest()
-        elif message['type'] == MessageType.QUERY_BLOCKCHAIN:
-            broadcast_all()
-        elif message['type'] == MessageType.RESPONSE_LATEST_BLOCK:
-            handle_latest_block(message['data'])
-        elif message['type'] == MessageType.RESPONSE_BLOCKCHAIN:
-            handle_blockchain_response(message['data'])
-        elif message['type'] == MessageType.RESPONSE_TRANSACTION:
-            handle_transaction(message['data'])
-        elif message['type'] == MessageType.DIFFICULT:
-            handle_difficult_change(message['data'])
+async def broadcast(message):
+    await run_on_loop(_broadcast(message))
 
 
-async def write(websocket, message):
-    data = json.dumps(message, cls=CustomJSONEncoder)
-    await websocket.send(data)
+async def _broadcast(message):
+    key = None
+    if get_type(message) == MessageType.RESPONSE_LATEST_BLOCK:
+        # Só o anúncio mais recente do topo da cadeia interessa aos peers.
+        key = 'latest'
 
+    connections.broadcast(list(sockets), message, key, encode)
 
-async def broadcast(message):
-    uris = deepcopy(list(sockets))
-    for uri in uris:
-        try:
-            async with websockets.connect(uri) as websocket:
-                await write(websocket, message)
-        except:
-            sockets.remove(uri)
+
+def get_type(message):
+    return codec.get_type(message)
+
+
+def drop_peer(uri):
+    sockets.discard(uri)
+    asyncio.ensure_future(connections.remove(uri))
+
+
+def get_broadcast_stats():
+    return connections.stats.to_dict()
+
+
+async def run_on_loop(task):
+    """
+    Run a coroutine on the P2P server event loop, where the peer connections
+    live, and wait for its result from any other loop.
+    """
+
+    if loop is None:
+        return await task
+
+    try:
+        running_loop = asyncio.get_running_loop()
+    except RuntimeError:
+        running_loop = None
+
+    if running_loop is loop:
+        return await task
+
+    future = asyncio.run_coroutine_threadsafe(task, loop)
+    return await asyncio.wrap_future(future)
 
 
 def connect_message():
     data = {
         'address': address,
-        'identifier': get_identifier()
+        'identifier': get_identifier(),
+        'encodings': codec.ENCODINGS,
+        'features': [INVENTORY_FEATURE, BLOCKS_FEATURE]
     }
     
     return Message(type=MessageType.CONNECT_MESSAGE, data=data)
@@ -151,6 +274,62 @@ def response_chain():
     )
 
 
+def query_blocks(locator, stream=True):
+    # Peers que não conhecem `stream` respondem com uma página de blocos.
+    return Message(
+        type=MessageType.QUERY_BLOCKS,
+        data={
+            'locator': locator,
+            'limit': MAX_BLOCKS_PER_MESSAGE,
+            'stream': stream
+        }
+    )
+
+
+def get_range(data, max_limit):
+    """
+    Find the blocks requested by a QUERY_BLOCKS message:
+    the ones following the first locator hash found in the chain, or the
+    whole chain if none is found.
+    :return: <tuple> Hash of the block in common, or None, the blocks found
+    and whether there are more blocks after them.
+    """
+
+    chain = blockchain.snapshot.chain
+    ancestor = find_ancestor(chain, data.get('locator', []))
+    limit = min(data.get('limit') or max_limit, max_limit)
+
+    start = 0 if ancestor is None else ancestor + 1
+    end = min(start + limit, len(chain))
+    ancestor_hash = None if ancestor is None else chain[ancestor].hash
+
+    return ancestor_hash, chain[start:end], end < len(chain)
+
+
+def response_blocks(data):
+    ancestor, blocks, more = get_range(data, MAX_BLOCKS_PER_MESSAGE)
+    return Message(
+        type=MessageType.RESPONSE_BLOCKS,
+        data={'ancestor': ancestor, 'blocks': blocks, 'more': more}
+    )
+
+
+def query_proof(transaction_id):
+    return Message(
+        type=MessageType.QUERY_PROOF,
+        data={'transaction_id': transaction_id}
+    )
+
+
+def response_proof(data):
+    transaction_id = data.get('transaction_id')
+    proof = blockchain.get_transaction_proof(transaction_id)
+    return Message(
+        type=MessageType.RESPONSE_PROOF,
+        data=proof or {'transaction_id': transaction_id, 'proof': None}
+    )
+
+
 def response_latest():
     return Message(
         type=MessageType.RESPONSE_LATEST_BLOCK,
@@ -158,9 +337,16 @@ def response_latest():
     )
 
 
-async def handle_connection(data):
+async def handle_connection(data, websocket=None):
+    # Peers que não anunciam formatos só entendem JSON.
+    connection = connections.get(data['address'])
+    connection.encoding = codec.choose_encoding(data.get('encodings'))
+    connection.features = set(data.get('features') or [])
+    if websocket is not None:
+        peer_uris[websocket] = data['address']
+
     await init_connection(data['address'])
-    blockchain.peer_addresses.add(data['identifier'])
+    blockchain.add_peer_address(data['identifier'])
 
 
 def handle_blockchain_response(bcdict):
@@ -169,26 +355,432 @@ def handle_blockchain_response(bcdict):
     blockchain.replace_blockchain(chain)
 
 
-def handle_latest_block(block_dict):
+def handle_latest_block(block_dict, websocket=None, encoding=codec.JSON):
     block = Block.from_dict(block_dict)
     last_block = blockchain.last_block
 
     if block.index == last_block.index and block.hash == last_block.hash:
         return
     elif block.index == last_block.index + 1 and block.previous_hash == last_block.hash:
-        blockchain.append_block(block)
+        if blockchain.append_block(block):
+            connect_orphans(block.hash)
+    else:
+        handle_orphan(block, websocket, encoding)
+
+
+def handle_orphan(block, websocket=None, encoding=codec.JSON):
+    """
+    Keep a block that does not extend the tip until it can be connected.
+    If its branch reaches a block of the chain it is connected right away;
+    otherwise only the missing blocks are requested.
+    """
+
+    if Block.hash_block(block) != block.hash or \
+            find_block_index(blockchain.chain, block.hash) is not None:
+        return
+
+    orphans.add(block)
+    path = orphans.get_path(block)
+    ancestor = find_block_index(blockchain.chain, path[0].previous_hash)
+
+    if ancestor is not None:
+        connect_blocks(ancestor, path + orphans.get_branch(block.hash))
+    elif websocket is not None:
+        request_blocks(websocket, encoding=encoding)
+    else:
+        exec_async(query_missing_blocks(get_locator(blockchain.chain)))
+
+
+def connect_blocks(ancestor, blocks) -> bool:
+    """
+    Add blocks of the orphan pool following the block at index `ancestor`:
+    appended if they extend the tip, or adopted as a fork if they have more
+    accumulated difficult.
+    """
+
+    if ancestor == len(blockchain.chain) - 1:
+        connected = blockchain.append_blocks(blocks)
+    else:
+        connected = blockchain.switch_fork(ancestor, blocks)
+
+    for block in blocks:
+        if connected or find_block_index(blockchain.chain, block.hash) is not None:
+            orphans.remove(block.hash)
+
+    if connected:
+        connect_orphans(blockchain.last_block.hash)
+    return connected
+
+
+def connect_orphans(hash):
+    """
+    Connect the orphan blocks waiting for the block with the given hash.
+    """
+
+    branch = orphans.get_branch(hash)
+    if not branch:
+        return
+
+    ancestor = find_block_index(blockchain.chain, hash)
+    if ancestor is not None:
+        connect_blocks(ancestor, branch)
+
+
+def get_peer_uri(websocket) -> str:
+    """
+    :return: <str> Server address of the peer at the other end of a
+    websocket, incoming or opened by us, or None if it is not known.
+    """
+
+    uri = peer_uris.get(websocket)
+    if uri is not None:
+        return uri
+
+    for uri in sockets:
+        if connections.get(uri).websocket is websocket:
+            return uri
+    return None
+
+
+async def query_chain(uri):
+    """
+    Ask a peer for its whole chain through its server address: peers
+    without QUERY_BLOCKS open a connection per message and close it without
+    reading the replies.
+    """
+
+    connection = connections.get(uri)
+    message = encode(query_all(), connection.encoding or codec.JSON)
+    if not await connections.send(uri, message):
+        print(f'Falha ao pedir a blockchain para {uri}')
+
+
+def request_blocks(websocket, locator=None, encoding=codec.JSON):
+    """
+    Ask a peer for the blocks following the last block both chains have in
+    common. Peers that do not answer QUERY_BLOCKS are asked for the whole
+    chain.
+    """
+
+    uri = get_peer_uri(websocket)
+    if uri is None or BLOCKS_FEATURE not in connections.get(uri).features:
+        if uri is not None:
+            asyncio.ensure_future(query_chain(uri))
+        else:
+            asyncio.ensure_future(
+                _query_missing_blocks(get_locator(blockchain.chain)))
+        return
+
+    if locator is None:
+        # Uma nova sincronização só começa quando a anterior termina.
+        if websocket in streams:
+            return
+        streams[websocket] = {'requested': True}
+        locator = get_locator(blockchain.chain)
+    asyncio.ensure_future(write(websocket, query_blocks(locator), encoding))
+
+
+async def handle_blocks_response(websocket, data, encoding=codec.JSON):
+    """
+    Apply a page of blocks received from a peer. Blocks extending the tip are
+    appended right away; blocks of a fork are kept until the last page, then
+    the fork is adopted if it has more accumulated difficult.
+    """
+
+    blocks = [Block.from_dict(bdict) for bdict in data['blocks']]
+    sync = syncs.get(websocket)
+    # O peer respondeu com páginas em vez de um stream.
+    streams.pop(websocket, None)
+
+    if sync is None:
+        ancestor = None
+        if data['ancestor'] is not None:
+            ancestor = find_ancestor(blockchain.chain, [data['ancestor']])
+        if data['ancestor'] is not None and ancestor is None:
+            return
+
+        sync = {'ancestor': ancestor, 'blocks': []}
+
+        if ancestor == len(blockchain.chain) - 1:
+            if blocks and not blockchain.append_blocks(blocks):
+                return
+            connect_orphans(blockchain.last_block.hash)
+            if data['more'] and blocks:
+                request_blocks(websocket, [blocks[-1].hash], encoding)
+            return
+
+        syncs[websocket] = sync
+
+    sync['blocks'].extend(blocks)
+    if len(sync['blocks']) > MAX_FORK_BLOCKS:
+        del syncs[websocket]
+        return
+
+    if data['more'] and blocks:
+        request_blocks(websocket, [blocks[-1].hash], encoding)
+        return
+
+    del syncs[websocket]
+    if blockchain.switch_fork(sync['ancestor'], sync['blocks']):
+        connect_orphans(blockchain.last_block.hash)
+
+
+def get_frames(start: int):
+    """
+    Split the chain from `start` into the frames of a block stream, reading
+    one frame of blocks at a time.
+    """
+
+    chain = blockchain.snapshot.chain
+    if start >= len(chain):
+        # Nada a enviar: um frame vazio encerra o stream.
+        yield chain[-1].hash, [], False
+        return
+
+    while start < len(chain):
+        blocks = []
+        transactions = 0
+        end = min(start + MAX_BLOCKS_PER_FRAME, len(chain))
+        for block in chain[start:end]:
+            blocks.append(block)
+            transactions += len(block.transactions)
+            if transactions >= MAX_TRANSACTIONS_PER_FRAME:
+                break
+
+        previous_hash = chain[start - 1].hash if start > 0 else None
+        start += len(blocks)
+        yield previous_hash, blocks, start < len(chain)
+
+
+async def stream_blocks(websocket, data, encoding=codec.JSON):
+    """
+    Send the blocks requested by a QUERY_BLOCKS message in compressed
+    frames. Each frame is sent once the peer has room for it, so only one
+    frame is held in memory.
+    """
+
+    ancestor = find_ancestor(blockchain.chain, data.get('locator', []))
+    start = 0 if ancestor is None else ancestor + 1
+
+    try:
+        for previous_hash, blocks, more in get_frames(start):
+            message = Message(
+                type=MessageType.BLOCKS_STREAM,
+                data={'ancestor': previous_hash, 'blocks': blocks, 'more': more}
+            )
+            await websocket.send(codec.compress(message, encoding))
+    except websockets.ConnectionClosed:
+        return
+
+
+async def query_missing_blocks(locator):
+    await run_on_loop(_query_missing_blocks(locator))
+
+
+async def _query_missing_blocks(locator):
+    blocks_peers = []
+    legacy_peers = []
+    for uri in sockets:
+        if BLOCKS_FEATURE in connections.get(uri).features:
+            blocks_peers.append(uri)
+        else:
+            legacy_peers.append(uri)
+
+    if blocks_peers:
+        connections.broadcast(blocks_peers, query_blocks(locator),
+                              encode=encode)
+    # Peers sem suporte a QUERY_BLOCKS enviam a cadeia inteira.
+    if legacy_peers:
+        connections.broadcast(legacy_peers, query_all(), encode=encode)
+
+
+def handle_blocks_stream(websocket, data):
+    """
+    Apply a frame of a block stream as soon as it arrives. Frames extending
+    the tip are appended. Frames of a fork are validated against the last
+    block received and kept only until the blocks received have more
+    accumulated difficult than the local blocks they replace; from then on
+    the fork is the chain and the next frames are appended, so memory does
+    not grow with the length of the peer's chain. A fork longer than
+    MAX_FORK_BLOCKS that still has less work fails the stream.
+    """
+
+    blocks = [Block.from_dict(bdict) for bdict in data['blocks']]
+    stream = streams.get(websocket)
+
+    if stream is None or stream.get('requested'):
+        ancestor = None
+        if data['ancestor'] is not None:
+            ancestor = find_ancestor(blockchain.chain, [data['ancestor']])
+            if ancestor is None:
+                streams.pop(websocket, None)
+                return
+
+        stream = {'ancestor': ancestor, 'blocks': None, 'tip': None,
+                  'failed': False}
+        if ancestor != len(blockchain.chain) - 1:
+            stream['blocks'] = []
+            if ancestor is not None:
+                stream['tip'] = blockchain.get_fork_base(ancestor)
+        streams[websocket] = stream
+
+    if not data['more']:
+        del streams[websocket]
+
+    if stream['failed'] or not blocks:
+        return
+
+    if stream['blocks'] is None:
+        if blocks[0].previous_hash != blockchain.last_block.hash or \
+                not blockchain.append_blocks(blocks):
+            stream['failed'] = True
+        else:
+            connect_orphans(blockchain.last_block.hash)
+        return
+
+    # Só os blocos novos são validados, a partir do último bloco recebido.
+    if stream['tip'] is None:
+        blocks[0].cumulative_work = Block.get_work(blocks[0])
+        valid = blockchain.validate_blocks(blocks[0], blocks[1:])
     else:
-        exec_async(broadcast(query_all()))
+        valid = blockchain.validate_blocks(stream['tip'], blocks)
+    stream['blocks'].extend(blocks)
+    stream['tip'] = blocks[-1]
+
+    if not valid or len(stream['blocks']) > MAX_FORK_BLOCKS:
+        stream['failed'] = True
+        stream['blocks'] = None
+        return
+
+    if blockchain.switch_fork(stream['ancestor'], stream['blocks'],
+                              validated=True):
+        stream['blocks'] = None
+        connect_orphans(blockchain.last_block.hash)
+
+
+async def request_proof(transaction_id, timeout: float = PROOF_TIMEOUT):
+    return await run_on_loop(_request_proof(transaction_id, timeout))
+
+
+async def _request_proof(transaction_id, timeout: float):
+    """
+    Ask the peers for the inclusion proof of a transaction.
+    :return: <dict> First proof received that checks out against a block of
+    the local chain, or None if no peer sends one within `timeout` seconds.
+    """
+
+    future = asyncio.get_running_loop().create_future()
+    proof_requests.setdefault(transaction_id, []).append(future)
+    connections.broadcast(list(sockets), query_proof(transaction_id),
+                          encode=encode)
+
+    try:
+        return await asyncio.wait_for(future, timeout)
+    except asyncio.TimeoutError:
+        return None
+    finally:
+        waiting = proof_requests.get(transaction_id, [])
+        if future in waiting:
+            waiting.remove(future)
+        if not waiting:
+            proof_requests.pop(transaction_id, None)
+
+
+def handle_proof_response(data):
+    """
+    Hand an inclusion proof received from a peer to the requests waiting
+    for it, if it is valid and its block is in the local chain.
+    """
+
+    waiting = proof_requests.get(data.get('transaction_id'))
+    if not waiting or not is_valid_proof_response(data):
+        return
+
+    for future in waiting:
+        if not future.done():
+            future.set_result(data)
+
+
+def is_valid_proof_response(data) -> bool:
+    if data.get('proof') is None or data.get('header') is None:
+        return False
+
+    try:
+        header = Block.from_header(data['header'])
+    except (KeyError, TypeError):
+        return False
+
+    if header.merkle_root is None or Block.hash_block(header) != header.hash:
+        return False
+
+    if find_ancestor(blockchain.snapshot.chain, [header.hash]) is None:
+        return False
+
+    return verify_merkle_proof(
+        data['transaction_id'], data['proof'], header.merkle_root)
 
 
 def handle_transaction(data):
     transaction = Transaction.from_dict(data)
 
-    blockchain.append_transaction(transaction)
+    if blockchain.append_transaction(transaction):
+        relay_transactions([transaction])
+
+
+def request_transactions(data):
+    """
+    Ask for the announced transactions this node does not have and has not
+    requested recently.
+    :return: <Message> The request, or None if nothing is missing.
+    """
+
+    now = time.monotonic()
+    for transaction_id in [transaction_id for transaction_id, requested_at
+                           in requested.items()
+                           if now - requested_at > REQUEST_TIMEOUT]:
+        del requested[transaction_id]
+
+    snapshot = blockchain.snapshot
+    missing = []
+    for transaction_id in data.get('transactions', [])[:MAX_INVENTORY]:
+        if transaction_id in snapshot.transaction_pool or \
+                transaction_id in requested or \
+                snapshot.get_block_index(transaction_id) is not None:
+            continue
+        requested[transaction_id] = now
+        missing.append(transaction_id)
+
+    if not missing:
+        return None
+
+    return Message(
+        type=MessageType.QUERY_TRANSACTIONS,
+        data={'transactions': missing}
+    )
+
+
+def response_transactions(data):
+    pool = blockchain.snapshot.transaction_pool
+    transactions = [pool.get(transaction_id) for transaction_id
+                    in data.get('transactions', [])[:MAX_INVENTORY]]
+    return Message(
+        type=MessageType.RESPONSE_TRANSACTIONS,
+        data=[transaction for transaction in transactions
+              if transaction is not None]
+    )
+
+
+def handle_transactions(data):
+    transactions = [Transaction.from_dict(trdict) for trdict in data]
+    for transaction in transactions:
+        requested.pop(transaction.id, None)
+
+    added = blockchain.append_transactions(transactions)
+    relay_transactions(added)
 
 
 def handle_difficult_change(difficult):
-    blockchain.difficult = difficult
+    blockchain.set_difficult(difficult)
 
 
 def broadcast_latest():
@@ -200,11 +792,70 @@ def broadcast_all():
 
 
 def broadcast_transaction(transaction):
-    message = {
-        'type': MessageType.RESPONSE_TRANSACTION,
-        'data': transaction
-    }
-    exec_async(broadcast(message))
+    relay_transactions([transaction])
+
+
+def relay_transactions(transactions):
+    if transactions:
+        exec_async(announce(transactions))
+
+
+async def announce(transactions):
+    await run_on_loop(_announce(transactions))
+
+
+async def _announce(transactions):
+    """
+    Queue transactions to be announced. Announcements go out together
+    after RELAY_INTERVAL, or as soon as MAX_INVENTORY ids are waiting.
+    """
+
+    global relay_timer
+
+    for transaction in transactions:
+        relay[transaction.id] = transaction
+
+    if len(relay) >= MAX_INVENTORY:
+        flush_relay()
+    elif relay_timer is None:
+        relay_timer = asyncio.get_running_loop().call_later(
+            RELAY_INTERVAL, flush_relay)
+
+
+def flush_relay():
+    global relay_timer
+
+    if relay_timer is not None:
+        relay_timer.cancel()
+        relay_timer = None
+
+    transactions = list(relay.values())
+    relay.clear()
+    if not transactions:
+        return
+
+    inventory_peers = []
+    legacy_peers = []
+    for uri in sockets:
+        if INVENTORY_FEATURE in connections.get(uri).features:
+            inventory_peers.append(uri)
+        else:
+            legacy_peers.append(uri)
+
+    if inventory_peers:
+        for start in range(0, len(transactions), MAX_INVENTORY):
+            ids = [transaction.id for transaction
+                   in transactions[start:start + MAX_INVENTORY]]
+            message = Message(type=MessageType.INVENTORY,
+                              data={'transactions': ids})
+            connections.broadcast(inventory_peers, message, encode=encode)
+
+    # Peers sem suporte a inventário recebem cada transação completa.
+    if legacy_peers:
+        for transaction in transactions:
+            message = Message(type=MessageType.RESPONSE_TRANSACTION,
+                              data=transaction)
+            connections.broadcast(legacy_peers, message, encode=encode)
 
 
 def broadcast_difficult(difficult):
@@ -219,32 +870,83 @@ def connect_to_peer(uri):
     exec_async(init_connection(uri))
 
 
-def exec_async(task):
-    event_loop = None
+def exec_async(task) -> Future:
+    """
+    Run a coroutine on the P2P server event loop without waiting for it.
+    Safe to call from any thread: Flask requests and the miner hand the work
+    over and carry on. Coroutines submitted before the loop starts run as
+    soon as it does, up to MAX_PENDING_TASKS; without a P2P server, as in
+    the benchmarks, they are dropped.
+    :return: <Future> Future with the result of the coroutine, None if it
+    was dropped.
+    """
+
+    with loop_lock:
+        if loop is None:
+            future = Future()
+            if address is None:
+                drop_task(task, future)
+                return future
+
+            pending_tasks.append((task, future))
+            if len(pending_tasks) > MAX_PENDING_TASKS:
+                drop_task(*pending_tasks.popleft())
+            return future
+
     try:
-        event_loop = asyncio.get_event_loop()
-    except:
-        event_loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(event_loop)
+        running_loop = asyncio.get_running_loop()
+    except RuntimeError:
+        running_loop = None
+
+    if running_loop is loop:
+        return asyncio.ensure_future(task)
+
+    return asyncio.run_coroutine_threadsafe(task, loop)
 
-    if event_loop.is_running():
-        asyncio.ensure_future(task)
+
+def drop_task(task, future: Future):
+    # Fechar a corrotina evita o aviso de corrotina nunca executada.
+    task.close()
+    future.set_result(None)
+
+
+def start_pending_tasks():
+    for task, future in pending_tasks:
+        asyncio.ensure_future(task).add_done_callback(
+            lambda done, future=future: copy_result(done, future))
+    pending_tasks.clear()
+
+
+def copy_result(done, future: Future):
+    if done.cancelled():
+        future.cancel()
+    elif done.exception() is not None:
+        future.set_exception(done.exception())
     else:
-        event_loop.run_until_complete(task)
+        future.set_result(done.result())
 
 
 async def main(ip, port):
+    global loop
+    with loop_lock:
+        loop = asyncio.get_running_loop()
+        start_pending_tasks()
     async with websockets.serve(handler, ip, port, close_timeout=60):
         await asyncio.Future()
 
 
-def init(ip, p2p_port, chain):
+def configure(ip, p2p_port, chain):
     global blockchain
     blockchain = chain
     global address
     address = f'ws://{ip}:{p2p_port}'
     print(f'P2P server running on: {address}', end='\n\n')
+
+
+def init(ip, p2p_port, chain):
+    configure(ip, p2p_port, chain)
     asyncio.run(main(ip, p2p_port))
 
 
 blockchain: Any = None
+connections = ConnectionPool(on_message=handle_message, on_dead=drop_peer)
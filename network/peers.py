@@ -0,0 +1,289 @@
+import asyncio
+import time
+from collections import deque
+
+import websockets
+
+PING_INTERVAL = 20  # in seconds
+PING_TIMEOUT = 20  # in seconds
+OPEN_TIMEOUT = 10  # in seconds
+BACKOFF_BASE = 1  # in seconds
+BACKOFF_MAX = 60  # in seconds
+MAX_FAILURES = 5  # consecutive failures before a peer is dropped
+SEND_TIMEOUT = 5  # in seconds
+MAX_QUEUE = 100  # messages waiting to be sent to a peer
+STATS_WINDOW = 100  # broadcasts kept for the propagation metric
+
+
+class Broadcast:
+    """
+    A message sent to several peers. Tracks how long it took until the last
+    peer received it. If `encode` is given, the message is encoded once per
+    encoding used by the peers.
+    """
+
+    def __init__(
+            self,
+            data,
+            peers: int,
+            stats: 'BroadcastStats' = None,
+            encode=None):
+        self.data = data
+        self.encode = encode
+        self.encoded = {}
+        self.pending = peers
+        self.delivered = 0
+        self.started_at = time.monotonic()
+        self.last_delivery = None
+        self.stats = stats
+
+        if peers == 0:
+            self._finish()
+
+    def get_data(self, encoding: str = None):
+        if self.encode is None:
+            return self.data
+
+        if encoding not in self.encoded:
+            self.encoded[encoding] = self.encode(self.data, encoding)
+        return self.encoded[encoding]
+
+    def done(self, delivered: bool):
+        if delivered:
+            self.delivered += 1
+            self.last_delivery = time.monotonic() - self.started_at
+
+        self.pending -= 1
+        if self.pending == 0:
+            self._finish()
+
+    def _finish(self):
+        if self.stats is not None:
+            self.stats.record(self)
+
+
+class BroadcastStats:
+    def __init__(self):
+        self.count = 0
+        self.dropped = 0
+        self.timeouts = 0
+        self.times = deque(maxlen=STATS_WINDOW)
+
+    def record(self, broadcast: Broadcast):
+        self.count += 1
+        if broadcast.last_delivery is not None:
+            self.times.append(broadcast.last_delivery)
+
+    def to_dict(self) -> dict:
+        times = list(self.times)
+        return {
+            'broadcasts': self.count,
+            'dropped': self.dropped,
+            'timeouts': self.timeouts,
+            'time_to_last_peer': {
+                'last': times[-1] if times else None,
+                'avg': sum(times) / len(times) if times else None,
+                'max': max(times) if times else None
+            }
+        }
+
+
+class PeerConnection:
+    """
+    Long-lived outbound connection to a peer, reused by every message sent to
+    it. A closed connection is reopened on the next send; after a failed
+    attempt, new attempts wait an exponential backoff.
+    """
+
+    def __init__(
+            self,
+            uri: str,
+            on_message=None,
+            on_dead=None,
+            stats: BroadcastStats = None):
+        self.uri = uri
+        self.on_message = on_message
+        self.on_dead = on_dead
+        self.stats = stats
+        self.websocket = None
+        self.encoding = None  # negotiated with the peer on connection
+        self.features = set()  # announced by the peer on connection
+        self.failures = 0
+        self.retry_at = 0
+        self._lock = asyncio.Lock()
+        self._reader = None
+        self._queue = deque()  # (broadcast, key)
+        self._wakeup = asyncio.Event()
+        self._sender = None
+
+    @property
+    def is_dead(self) -> bool:
+        return self.failures >= MAX_FAILURES
+
+    @property
+    def is_open(self) -> bool:
+        return self.websocket is not None and self.websocket.open
+
+    async def _connect(self) -> bool:
+        if time.monotonic() < self.retry_at:
+            return False
+
+        try:
+            self.websocket = await asyncio.wait_for(
+                websockets.connect(self.uri, ping_interval=PING_INTERVAL,
+                                   ping_timeout=PING_TIMEOUT),
+                OPEN_TIMEOUT)
+        except Exception:
+            self.websocket = None
+            self.failures += 1
+            backoff = min(BACKOFF_BASE * 2 ** (self.failures - 1), BACKOFF_MAX)
+            self.retry_at = time.monotonic() + backoff
+            return False
+
+        self._reader = asyncio.ensure_future(self._read(self.websocket))
+        return True
+
+    async def _read(self, websocket):
+        # Mensagens recebidas pela conexão de saída também são tratadas, e
+        # consumi-las mantém o keepalive funcionando.
+        try:
+            async for data in websocket:
+                if self.on_message is not None:
+                    await self.on_message(websocket, data)
+        except Exception:
+            pass
+
+    async def send(self, data) -> bool:
+        """
+        Send a message, opening the connection if needed. A connection found
+        closed is reopened once before the send is counted as failed.
+        :return: <bool> True if the message was sent.
+        """
+
+        async with self._lock:
+            for _ in range(2):
+                if not self.is_open and not await self._connect():
+                    return False
+
+                try:
+                    await self.websocket.send(data)
+                except Exception:
+                    self.websocket = None
+                    continue
+
+                self.failures = 0
+                self.retry_at = 0
+                return True
+
+            self.failures += 1
+            return False
+
+    def enqueue(self, broadcast: Broadcast, key: str = None):
+        """
+        Queue a message to be sent by this peer's sender task. A message with
+        a key replaces the queued messages with the same key, which are
+        stale. When the queue is full the oldest message is dropped.
+        """
+
+        if key is not None:
+            for entry in [entry for entry in self._queue if entry[1] == key]:
+                self._queue.remove(entry)
+                self._drop(entry[0])
+
+        if len(self._queue) >= MAX_QUEUE:
+            self._drop(self._queue.popleft()[0])
+
+        self._queue.append((broadcast, key))
+        self._wakeup.set()
+
+        if self._sender is None or self._sender.done():
+            self._sender = asyncio.ensure_future(self._send_queued())
+
+    def _drop(self, broadcast: Broadcast):
+        if self.stats is not None:
+            self.stats.dropped += 1
+        broadcast.done(False)
+
+    async def _send_queued(self):
+        while True:
+            if not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            broadcast, _ = self._queue.popleft()
+            try:
+                delivered = await asyncio.wait_for(
+                    self.send(broadcast.get_data(self.encoding)),
+                    SEND_TIMEOUT)
+            except asyncio.TimeoutError:
+                delivered = False
+                self.failures += 1
+                self.websocket = None
+                if self.stats is not None:
+                    self.stats.timeouts += 1
+
+            broadcast.done(delivered)
+
+            if not delivered and self.is_dead and self.on_dead is not None:
+                self.on_dead(self.uri)
+
+    async def close(self):
+        for broadcast, _ in self._queue:
+            broadcast.done(False)
+        self._queue.clear()
+        if self._sender is not None:
+            self._sender.cancel()
+            self._sender = None
+
+        if self.websocket is not None:
+            await self.websocket.close()
+            self.websocket = None
+        if self._reader is not None:
+            self._reader.cancel()
+            self._reader = None
+
+
+class ConnectionPool:
+    """
+    Outbound connections to the peers, by URI.
+    """
+
+    def __init__(self, on_message=None, on_dead=None):
+        self.on_message = on_message
+        self.on_dead = on_dead
+        self.connections = {}
+        self.stats = BroadcastStats()
+
+    def get(self, uri: str) -> PeerConnection:
+        connection = self.connections.get(uri)
+        if connection is None:
+            connection = PeerConnection(
+                uri, self.on_message, self.on_dead, self.stats)
+            self.connections[uri] = connection
+        return connection
+
+    def broadcast(
+            self,
+            uris,
+            data,
+            key: str = None,
+            encode=None) -> Broadcast:
+        """
+        Queue a message to every peer at once; each peer sends it from its
+        own queue, so a slow peer does not delay the others.
+        """
+
+        uris = list(uris)
+        broadcast = Broadcast(data, len(uris), self.stats, encode)
+        for uri in uris:
+            self.get(uri).enqueue(broadcast, key)
+        return broadcast
+
+    async def send(self, uri: str, data) -> bool:
+        return await self.get(uri).send(data)
+
+    async def remove(self, uri: str):
+        connection = self.connections.pop(uri, None)
+        if connection is not None:
+            await connection.close()
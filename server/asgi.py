@@ -0,0 +1,84 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+
+from server import server
+from network import p2p_server
+
+try:
+    import uvicorn
+except ImportError:  # uvicorn é opcional, usado apenas no modo ASGI.
+    uvicorn = None
+
+HTTP_WORKERS = 16  # threads running Flask routes
+
+executor = ThreadPoolExecutor(HTTP_WORKERS, thread_name_prefix='http')
+
+
+class WsgiInstance(WsgiToAsgiInstance):
+    """
+    Run the WSGI application in `executor` and send its response from the
+    event loop. asgiref runs every request in one shared thread, and fails
+    when requests overlap; the routes here are short and their responses
+    small, so each response is buffered and sent at once instead.
+    """
+
+    async def run_wsgi_app(self, body):
+        loop = asyncio.get_running_loop()
+        output = await loop.run_in_executor(executor, self.get_output, body)
+
+        await self.send(self.response_start)
+        await self.send({'type': 'http.response.body', 'body': output})
+
+    def get_output(self, body) -> bytes:
+        environ = self.build_environ(self.scope, body)
+        response = self.wsgi_application(environ, self.start_response)
+        try:
+            return b''.join(response)
+        finally:
+            if hasattr(response, 'close'):
+                response.close()
+
+
+class Application(WsgiToAsgi):
+    async def __call__(self, scope, receive, send):
+        instance = WsgiInstance(self.wsgi_application)
+        instance.send = send
+        await instance(scope, receive, send)
+
+
+# As rotas do Flask rodam nas threads de `executor`, sem bloquear o event
+# loop em que roda o servidor P2P.
+application = Application(server.app)
+
+
+def is_available() -> bool:
+    return uvicorn is not None
+
+
+async def serve(ip_addr, http_port, ws_port, chain):
+    """
+    Serve the HTTP routes and the P2P server on the running event loop.
+    """
+
+    server.configure(ip_addr, http_port, ws_port, chain)
+    p2p_server.configure(ip_addr, ws_port, chain)
+
+    config = uvicorn.Config(application, host=ip_addr, port=http_port,
+                            log_level='warning', lifespan='off', ws='none')
+    http_server = uvicorn.Server(config)
+
+    p2p_task = asyncio.ensure_future(p2p_server.main(ip_addr, ws_port))
+    try:
+        await http_server.serve()
+    finally:
+        p2p_task.cancel()
+
+
+def run(ip_addr, http_port, ws_port, chain):
+    if not is_available():
+        raise RuntimeError(
+            "Modo ASGI indisponível: instale o uvicorn.")
+
+    asyncio.run(serve(ip_addr, http_port, ws_port, chain))
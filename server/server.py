@@ -3,8 +3,10 @@ import sys
 from threading import Thread
 
 from flask import Flask, redirect, render_template, request, url_for, jsonify
+from model import analytics, pagination
 from model.blockchain import Blockchain
 from model.wallet import get_identifier, init_wallet
+from network import p2p_server
 from utils import CustomJSONEncoder
 from werkzeug.exceptions import HTTPException
 
@@ -59,12 +61,24 @@ def mineblock():
 
     response = {
         'title': 'Minerar',
-        'length': len(blockchain.chain),
-        'mining': blockchain.mining
+        'length': len(blockchain.snapshot.chain),
+        'mining': blockchain.mining,
+        'hash_rate': blockchain.get_hash_rate()
     }
     return render_template('mine.html', **response), 200
 
 
+@app.route('/mine/status')
+def mine_status():
+    response = {
+        'length': len(blockchain.snapshot.chain),
+        'mining': blockchain.mining,
+        'hash_rate': blockchain.get_hash_rate()
+    }
+
+    return jsonify(response), 200
+
+
 @app.route("/transaction/new/add", methods=["POST"])
 def new_transaction():
     if request.method == 'POST':
@@ -86,18 +100,42 @@ def new_transaction():
 
 @app.route('/chain', methods=['GET'])
 def get_chain():
+    chain = blockchain.snapshot.chain
+    try:
+        blocks, next_cursor = pagination.get_block_range(
+            chain, request.args.get('cursor'))
+    except ValueError:
+        # Cursor inválido: a página mostra o topo da cadeia.
+        blocks, next_cursor = pagination.get_block_range(chain)
+
     response = {
         'title': 'Blockchain',
-        'chain': blockchain.chain,
-        'length': len(blockchain.chain)
+        'chain': blocks,
+        'length': len(chain),
+        'next_cursor': next_cursor
     }
     return render_template('chain.html', **response), 200
 
 
+@app.route('/chain/blocks')
+def list_blocks():
+    return paginate(pagination.get_blocks_page, blockchain.snapshot.chain)
+
+
+@app.route('/chain/blocks/<identifier>')
+def get_block(identifier):
+    block = pagination.find_block(blockchain.snapshot.chain, identifier)
+
+    if block is None:
+        return jsonify({'message': "Bloco não encontrado."}), 404
+
+    return jsonify(block), 200
+
+
 @app.route('/chain/length')
 def get_chain_length():
     response = {
-        'length': len(blockchain.chain)
+        'length': len(blockchain.snapshot.chain)
     }
 
     return jsonify(response), 200
@@ -105,14 +143,156 @@ def get_chain_length():
 
 @app.route('/transactions', methods=["GET"])
 def get_transactions():
+    snapshot = blockchain.snapshot
+    cursor = request.args.get('cursor')
+    try:
+        page = pagination.get_transactions_page(snapshot.chain, cursor)
+    except ValueError:
+        # Cursor inválido: a página mostra as transações mais recentes.
+        cursor = None
+        page = pagination.get_transactions_page(snapshot.chain)
+
+    pending = []
+    if cursor is None:
+        pending = pagination.get_pending_page(
+            snapshot.transaction_pool)['transactions']
+
     response = {
         'title': 'Transações',
-        'transactions': blockchain.get_all_transactions()
+        'pending': pending,
+        'transactions': page['transactions'],
+        'next_cursor': page['next_cursor']
     }
 
     return render_template('transactions.html', **response)
 
 
+@app.route('/transactions/confirmed')
+def list_transactions():
+    return paginate(pagination.get_transactions_page,
+                    blockchain.snapshot.chain)
+
+
+@app.route('/transactions/pending')
+def list_pending_transactions():
+    return paginate(pagination.get_pending_page,
+                    blockchain.snapshot.transaction_pool)
+
+
+@app.route('/transactions/<transaction_id>')
+def get_transaction(transaction_id):
+    transaction = pagination.find_transaction(
+        blockchain.snapshot, transaction_id)
+
+    if transaction is None:
+        return jsonify({'message': "Transação não encontrada."}), 404
+
+    return jsonify(transaction), 200
+
+
+def paginate(get_page, items):
+    try:
+        page = get_page(items, request.args.get('cursor'),
+                        request.args.get('limit'))
+    except ValueError:
+        return jsonify({'message': "Cursor ou limite inválido."}), 400
+
+    return jsonify(page), 200
+
+
+@app.route('/transactions/<transaction_id>/proof')
+def get_transaction_proof(transaction_id):
+    proof = blockchain.get_transaction_proof(transaction_id)
+
+    if proof is None:
+        response = {
+            'message': "Transação não encontrada em um bloco confirmado."
+        }
+        return jsonify(response), 404
+
+    return jsonify(proof), 200
+
+
+@app.route('/transactions/<transaction_id>/proof/peers')
+def get_peer_transaction_proof(transaction_id):
+    """
+    Check with the peers that a transaction is confirmed: the proof sent by
+    a peer is verified against the Merkle root of a block of the local
+    chain, as a wallet checks a payment.
+    """
+
+    future = p2p_server.exec_async(p2p_server.request_proof(transaction_id))
+    try:
+        proof = future.result(p2p_server.PROOF_TIMEOUT + 1)
+    except Exception:
+        proof = None
+
+    if proof is None:
+        response = {
+            'message': "Nenhum peer enviou uma prova válida da transação."
+        }
+        return jsonify(response), 404
+
+    return jsonify(proof), 200
+
+
+@app.route('/analytics/balances')
+def get_balances():
+    engine = get_analytics()
+    if engine is None:
+        return analytics_unavailable()
+
+    addresses = request.args.getlist('address') or None
+    response = {
+        'height': engine.height,
+        'balances': engine.get_balance_map(addresses)
+    }
+    return jsonify(response), 200
+
+
+@app.route('/analytics/top')
+def get_top_holders():
+    engine = get_analytics()
+    if engine is None:
+        return analytics_unavailable()
+
+    limit = request.args.get('limit', 10, type=int)
+    response = {
+        'height': engine.height,
+        'holders': engine.get_top_holders(
+            min(limit, pagination.MAX_PAGE_SIZE))
+    }
+    return jsonify(response), 200
+
+
+@app.route('/analytics/blocks')
+def get_block_stats():
+    engine = get_analytics()
+    if engine is None:
+        return analytics_unavailable()
+
+    start = request.args.get('start', 0, type=int)
+    limit = request.args.get('limit', analytics.MAX_SERIES, type=int)
+    response = {
+        'height': engine.height,
+        'blocks': engine.get_block_stats(start, limit)
+    }
+    return jsonify(response), 200
+
+
+def get_analytics():
+    if not analytics.is_available():
+        return None
+    return analytics.get_analytics(blockchain.snapshot.chain)
+
+
+def analytics_unavailable():
+    response = {
+        'message': "Análise indisponível: instale o NumPy."
+    }
+    return jsonify(response), 503
+
+
 @app.route("/nodes/register", methods=["GET", "POST"])
 def register_node():
     if request.method == 'POST':
@@ -127,6 +307,17 @@ def register_node():
     return render_template('peers.html', **response)
 
 
+@app.route("/nodes/stats")
+def get_nodes_stats():
+    response = {
+        'peers': len(blockchain.get_nodes()),
+        'broadcast': p2p_server.get_broadcast_stats(),
+        'persistence': blockchain.get_persistence_stats()
+    }
+
+    return jsonify(response), 200
+
+
 @app.route("/login", methods=["GET", "POST"])
 def login():
     global user_identified
@@ -137,10 +328,12 @@ def login():
     if request.method == 'POST':
         user = request.form['username']
         passwd = request.form['password']
+        # Alterações pendentes são gravadas para o usuário anterior.
+        blockchain.flush()
         init_wallet(user, passwd)
         user_identified = True
         chain = Blockchain.load_blockchain(get_identifier())
-        blockchain.replace_blockchain(chain)
+        blockchain.restore_blockchain(chain)
         return redirect(url_for('index'))
 
     response = {
@@ -154,6 +347,7 @@ def login():
 def logout():
     global user_identified
     user_identified = False
+    blockchain.flush()
     return redirect(url_for("index"))
 
 
@@ -197,7 +391,7 @@ def not_found(e):
     return render_template("error.html", **response)
 
 
-def run(ip_addr, http_port, ws_port, chain):
+def configure(ip_addr, http_port, ws_port, chain):
     global p2p_port
     global _http_port
     global blockchain
@@ -209,6 +403,10 @@ def run(ip_addr, http_port, ws_port, chain):
     p2p_port = ws_port
     blockchain = chain
 
+
+def run(ip_addr, http_port, ws_port, chain):
+    configure(ip_addr, http_port, ws_port, chain)
+
     cli = sys.modules['flask.cli']
     cli.show_server_banner = lambda *x: None
     app.run(ip_addr, http_port)
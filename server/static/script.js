@@ -1,12 +1,17 @@
 let messages = document.getElementById("messages");
+let hashRate = document.getElementById("hash-rate");
 
 const listenForMinedBlocks = async () => {
   let numOfBlocks = document.currentScript.getAttribute('length');
-  let url = new URL(`${window.location.origin}/chain/length`);
+  let url = new URL(`${window.location.origin}/mine/status`);
   setInterval(async () => {
     response = await fetch(url);
     result = await response.json();
 
+    if (hashRate) {
+      hashRate.innerText = Math.round(result.hash_rate);
+    }
+
     if (result.length != numOfBlocks) {
       let message = document.createElement("p");
       message.innerText = "Novos blocos minerados.";
@@ -0,0 +1,45 @@
+import unittest
+
+import model  # noqa: F401 (model precisa ser importado antes de network)
+from model import Block
+from model.transaction import Transaction
+from network.codec import BINARY, decode, encode
+
+
+def round_trip(value):
+    return decode(encode({'type': 0, 'data': value}, BINARY))['data']
+
+
+class CodecTest(unittest.TestCase):
+    def test_int_timestamp_keeps_transaction_id(self):
+        transaction = Transaction('a' * 64, 'b' * 64, 5, timestamp=1640000000)
+
+        decoded = Transaction.from_dict(round_trip(transaction))
+
+        self.assertIsInstance(decoded.timestamp, int)
+        self.assertEqual(decoded.id, transaction.id)
+
+    def test_int_timestamp_keeps_block_hash(self):
+        transaction = Transaction('a' * 64, 'b' * 64, 5, timestamp=1640000000)
+        block = Block(index=1, transactions=[transaction], proof=42,
+                      difficult=2, previous_hash='c' * 64,
+                      timestamp=1640000001)
+
+        decoded = Block.from_dict(round_trip(block))
+
+        self.assertIsInstance(decoded.timestamp, int)
+        self.assertEqual(Block.hash_block(decoded), block.hash)
+        self.assertEqual(decoded.transactions[0].id, transaction.id)
+
+    def test_float_timestamp_keeps_block_hash(self):
+        block = Block(index=1, transactions=[], proof=42, difficult=2,
+                      previous_hash='c' * 64, timestamp=1640000001.5)
+
+        decoded = Block.from_dict(round_trip(block))
+
+        self.assertEqual(decoded.timestamp, block.timestamp)
+        self.assertEqual(Block.hash_block(decoded), block.hash)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,11 @@
-from typing import Set
+from collections.abc import Sequence, Set
 from json import JSONEncoder
 
 
 class CustomJSONEncoder(JSONEncoder):
     def default(self, o):
-        if isinstance(o, Set):
+        if isinstance(o, (Set, Sequence)):
             return list(o)
+        if hasattr(o, 'to_dict'):
+            return o.to_dict()
         return o.__dict__